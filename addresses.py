@@ -0,0 +1,98 @@
+import re
+
+# Floor/suite/apartment designators, e.g. "Floor 1A", "Suite 200", "Apt 3B", "Unit 5", "#3B"
+UNIT_PATTERN = re.compile(r'\s+(?:(?:Floor|Suite|Apt|Apartment|Unit)\s+\w+|#\s*\w+)\s*', flags=re.IGNORECASE)
+
+# Trailing ZIP or ZIP+4
+ZIP_PATTERN = re.compile(r'\s*\b\d{5}(?:-\d{4})?\s*$')
+
+# Locality and state assumed when an address leaves them out (matches the search form's auto-complete)
+DEFAULT_LOCALITY = 'brooklyn'
+DEFAULT_STATE = 'ny'
+STATE_ABBREVIATIONS = {'ny', 'nj', 'ct', 'pa'}
+# Localities recognized at the end of an address written without commas
+KNOWN_LOCALITIES = ['staten island', 'new york', 'brooklyn', 'manhattan', 'queens', 'bronx']
+
+# USPS-style abbreviations for street suffixes and directions
+SUFFIX_ABBREVIATIONS = {
+    'street': 'st',
+    'avenue': 'ave',
+    'av': 'ave',
+    'boulevard': 'blvd',
+    'road': 'rd',
+    'place': 'pl',
+    'drive': 'dr',
+    'lane': 'ln',
+    'court': 'ct',
+    'parkway': 'pkwy',
+    'square': 'sq',
+    'terrace': 'ter',
+    'highway': 'hwy',
+    'plaza': 'plz',
+    'north': 'n',
+    'south': 's',
+    'east': 'e',
+    'west': 'w',
+}
+
+
+def simplify_address(address: str) -> str:
+    """Remove floor/suite/apt info from an address"""
+    return re.sub(r'\s+,', ',', UNIT_PATTERN.sub(' ', address)).strip()
+
+
+def _split_locality(tokens: list) -> tuple:
+    """Peel a known locality off the end of street tokens; returns (street tokens, locality or None)"""
+    for locality in KNOWN_LOCALITIES:
+        words = locality.split()
+        if len(tokens) > len(words) + 1 and tokens[-len(words):] == words:
+            return tokens[:-len(words)], locality
+    return tokens, None
+
+
+def _split_state(tokens: list, after_locality: bool) -> tuple:
+    """
+    Peel a trailing state off locality tokens; returns (tokens, state or None).
+    Without commas (`after_locality`), a trailing 'ct' or 'ny' only counts as
+    a state when a known locality precedes it, so "12 Smith Ct" keeps its suffix.
+    """
+    if len(tokens) >= 2 and tokens[-2:] == ['new', 'york'] and (not after_locality or len(tokens) > 2):
+        rest = tokens[:-2]
+        if not after_locality or _split_locality(rest)[1]:
+            return rest, 'ny'
+    if tokens and tokens[-1] in STATE_ABBREVIATIONS:
+        rest = tokens[:-1]
+        if not after_locality or _split_locality(rest)[1]:
+            return rest, tokens[-1]
+    return tokens, None
+
+
+def normalize_address(address: str) -> str:
+    """
+    Canonical cache key for an address: "<street> <locality> <state>".
+    Equivalent spellings ("558 Fulton ST, Brooklyn, NY", "558 Fulton St",
+    "558 Fulton St, Brooklyn", "558 Fulton Street Brooklyn NY 11201") map to
+    the same key by ignoring case, punctuation, extra whitespace, units, ZIP
+    codes and suffix spelling, and filling in the default locality and state.
+    """
+    text = simplify_address(str(address)).lower().strip()
+    text = ZIP_PATTERN.sub('', re.sub(r'[\s,]+$', '', text))
+    parts = [' '.join(re.sub(r'[.;]', ' ', part).split()) for part in text.split(',')]
+    parts = [part for part in parts if part]
+    if not parts:
+        return f"{DEFAULT_LOCALITY} {DEFAULT_STATE}"
+
+    street = parts[0].split()
+    if len(parts) > 1:
+        # "street, locality[, state]": everything after the first comma is locality and state
+        locality_tokens, state = _split_state(' '.join(parts[1:]).split(), after_locality=False)
+        locality = ' '.join(locality_tokens) or None
+    else:
+        # No commas: state and locality can only be recognized at the end of the street
+        street, state = _split_state(street, after_locality=True)
+        locality = None
+    if locality is None:
+        street, locality = _split_locality(street)
+
+    street = [SUFFIX_ABBREVIATIONS.get(token, token) for token in street]
+    return ' '.join(street + [locality or DEFAULT_LOCALITY, state or DEFAULT_STATE])
@@ -0,0 +1,79 @@
+import csv
+import glob
+import sys
+
+import pandas as pd
+
+from addresses import ZIP_PATTERN, normalize_address
+from geocoder import NominatimBackend, TokenBucket
+from utils import GAZETTEER_FILE
+
+# Regenerates the offline gazetteer from every address in the shipped program
+# CSVs. Addresses already in the table keep their coordinates (pass --refresh
+# to look them all up again); new ones are geocoded with Nominatim at
+# 1 request/second, as are rows flagged approximate (placed by hand). ZIP-centroid
+# rows are kept as they are.
+# Usage: python build_gazetteer.py [--refresh] [path/to/ProgramData.csv ...]
+
+
+def shipped_addresses(paths):
+    """Unique program addresses across the CSVs, one spelling per normalized address"""
+    addresses = {}
+    for path in paths:
+        for address in pd.read_csv(path, dtype=str).get('Address', pd.Series(dtype=str)).dropna():
+            addresses.setdefault(normalize_address(address), address.strip())
+    return addresses
+
+
+def build_gazetteer(paths, gazetteer_path: str = GAZETTEER_FILE, refresh: bool = False):
+    """Add every shipped address missing from the gazetteer; returns the addresses nothing matched"""
+    with open(gazetteer_path, newline='') as f:
+        table = list(csv.DictReader(f))
+    address_rows = [row for row in table if row['address']]
+    zip_rows = [row for row in table if not row['address']]
+
+    known = {normalize_address(row['address']) for row in address_rows}
+    for key, address in sorted(shipped_addresses(paths).items()):
+        if key not in known:
+            match = ZIP_PATTERN.search(address)
+            address_rows.append({'address': address, 'zip': match.group(0).strip()[:5] if match else '',
+                                 'lat': '', 'lon': '', 'approximate': ''})
+
+    remote = NominatimBackend(TokenBucket(rate=1.0, capacity=1.0))
+    missing = []
+    for row in address_rows:
+        if row['lat'] and not row.get('approximate') and not refresh:
+            continue
+        try:
+            coords = remote.geocode(row['address'])
+        except Exception as e:
+            print(f"Error geocoding address {row['address']}: {str(e)}")
+            coords = None
+        if coords:
+            row['lat'], row['lon'] = coords
+            row['approximate'] = ''
+        elif not row['lat']:
+            missing.append(row['address'])
+
+    with open(gazetteer_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['address', 'zip', 'lat', 'lon', 'approximate'],
+                                lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(row for row in address_rows if row['lat'])
+        writer.writerows(zip_rows)
+
+    print(f"Wrote {len(address_rows) - len(missing)} addresses and {len(zip_rows)} ZIP centroids to {gazetteer_path}")
+    for address in missing:
+        print(f"Not in gazetteer (no match): {address}")
+    for row in address_rows:
+        if row.get('approximate'):
+            print(f"Still approximate (placed by hand): {row['address']}")
+    return missing
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    refresh = '--refresh' in args
+    paths = [arg for arg in args if arg != '--refresh'] or sorted(glob.glob('attached_assets/*.csv'))
+    paths = [path for path in paths if path != GAZETTEER_FILE]
+    sys.exit(1 if build_gazetteer(paths, refresh=refresh) else 0)
@@ -0,0 +1,11 @@
+import sys
+
+from utils import compile_data
+
+# Compile step for deploys: writes the processed binary snapshot next to each
+# CSV so the app memory-maps it on cold start instead of parsing the CSV.
+# Usage: python compile_data.py [path/to/ProgramData.csv ...]
+if __name__ == '__main__':
+    paths = sys.argv[1:] or ['attached_assets/ProgramData.csv']
+    for path in paths:
+        print(f"Wrote {compile_data(path)}")
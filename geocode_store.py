@@ -0,0 +1,288 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+Coordinates = Optional[Tuple[float, float]]
+
+# Entry statuses: a resolved address, a lookup that found nothing, a
+# lookup that failed (timeout, 5xx, circuit open) and should be retried sooner,
+# and a fallback (ZIP centroid) used because a more precise backend failed
+FOUND = 'found'
+NOT_FOUND = 'not_found'
+ERROR = 'error'
+APPROXIMATE = 'approximate'
+
+
+class GeocodeEntry(NamedTuple):
+    coords: Coordinates
+    status: str
+    updated_at: float
+    query: str
+
+    def is_expired(self, ttls: Dict[str, float], now: Optional[float] = None) -> bool:
+        """True if this entry's status has a TTL and it has run out"""
+        ttl = ttls.get(self.status)
+        if ttl is None:
+            return False
+        return (now if now is not None else time.time()) - self.updated_at >= ttl
+
+
+def read_json_cache(path: str) -> Dict[str, Coordinates]:
+    """Read a legacy geocode_cache.json file (address -> [lat, lon] or null)"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+            # Convert lists back to tuples (JSON doesn't support tuples)
+            return {k: tuple(v) if v else None for k, v in data.items()}
+    except Exception as e:
+        print(f"Error loading cache: {e}")
+        return {}
+
+
+def write_json_cache(path: str, cache: Dict[str, Coordinates]):
+    """Atomically write a JSON snapshot of the cache (temp file + rename)"""
+    data = {k: list(v) if v else None for k, v in cache.items()}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class GeocodeStore:
+    """
+    Persistent address -> coordinates mapping backed by SQLite in WAL mode.
+
+    Every write is a single-row transaction, so a crash can never leave a
+    half-written cache and multiple Streamlit worker processes can share the
+    same database file. Entries are mirrored in memory for fast reads; a miss
+    in memory falls through to the database to pick up rows written by other
+    processes. The write-ahead log is checkpointed every `compact_every` writes,
+    and when `export_path` is set a JSON snapshot is written there at the same time.
+    Addresses are stored under `key_func(address)`, so equivalent spellings
+    share one entry.
+
+    Mapping access (`store[address]`) returns coordinates or None; entry()
+    returns the typed GeocodeEntry with its status and timestamp. All access
+    is safe from multiple threads: writes and snapshots hold the store lock.
+    `version` goes up whenever an entry is added or changed, so callers can
+    tell when results derived from the store are stale.
+    """
+
+    def __init__(self, db_path: str, seed_path: Optional[str] = None, compact_every: int = 200,
+                 key_func: Callable[[str], str] = lambda address: address, export_path: Optional[str] = None):
+        self.db_path = db_path
+        self.export_path = export_path
+        self.compact_every = compact_every
+        self.key_func = key_func
+        self._lock = threading.RLock()
+        self._writes_since_compact = 0
+        self.version = 0
+        self._conn = sqlite3.connect(db_path, timeout=10.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                " address TEXT PRIMARY KEY,"
+                " lat REAL,"
+                " lon REAL,"
+                " updated_at REAL NOT NULL)"
+            )
+        self._migrate_schema()
+
+        if seed_path:
+            self._seed_from_json(seed_path)
+        self.collapse_keys()
+        self._entries: Dict[str, GeocodeEntry] = self._read_all()
+
+    def _migrate_schema(self):
+        """Add the status/query columns to databases created before typed entries"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(geocode)")}
+        with self._lock, self._conn:
+            if 'status' not in columns:
+                self._conn.execute("ALTER TABLE geocode ADD COLUMN status TEXT")
+                self._conn.execute(
+                    "UPDATE geocode SET status = CASE WHEN lat IS NULL THEN ? ELSE ? END",
+                    (NOT_FOUND, FOUND)
+                )
+            if 'query' not in columns:
+                self._conn.execute("ALTER TABLE geocode ADD COLUMN query TEXT")
+
+    def _seed_from_json(self, seed_path: str):
+        """Import a legacy JSON cache without overwriting newer rows"""
+        seed = read_json_cache(seed_path)
+        if not seed:
+            return
+        now = time.time()
+        rows = [(self.key_func(k), v[0] if v else None, v[1] if v else None, FOUND if v else NOT_FOUND, now, k)
+                for k, v in seed.items()]
+        # A resolved spelling wins over a failed one for the same key
+        rows.sort(key=lambda row: row[1] is not None, reverse=True)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO geocode (address, lat, lon, status, updated_at, query)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def collapse_keys(self):
+        """
+        Migrate rows stored under non-canonical keys. Duplicates collapse into
+        one row per key, preferring resolved coordinates, then the newest row.
+        The read and the rewrite happen in one IMMEDIATE transaction, so rows
+        another process writes meanwhile are never lost. A no-op once keys
+        are canonical.
+        """
+        with self._lock:
+            # Take the write lock before reading: the rewrite is based on this snapshot
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT address, lat, lon, status, updated_at, query FROM geocode"
+                ).fetchall()
+                if all(self.key_func(row[0]) == row[0] for row in rows):
+                    self._conn.commit()
+                    return
+
+                merged: Dict[str, tuple] = {}
+                for address, lat, lon, status, updated_at, query in rows:
+                    key = self.key_func(address)
+                    rank = (lat is not None, updated_at)
+                    if key not in merged or rank > merged[key][0]:
+                        merged[key] = (rank, (key, lat, lon, status, updated_at, query or address))
+
+                self._conn.execute("DELETE FROM geocode")
+                self._conn.executemany(
+                    "INSERT INTO geocode (address, lat, lon, status, updated_at, query)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [row for _, row in merged.values()]
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            print(f"Collapsed {len(rows)} geocode entries into {len(merged)} canonical addresses")
+
+    @staticmethod
+    def _to_entry(key: str, lat, lon, status, updated_at, query) -> GeocodeEntry:
+        coords = (lat, lon) if lat is not None else None
+        return GeocodeEntry(coords, status or (FOUND if coords else NOT_FOUND), updated_at, query or key)
+
+    def _read_all(self) -> Dict[str, GeocodeEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT address, lat, lon, status, updated_at, query FROM geocode"
+            ).fetchall()
+        return {row[0]: self._to_entry(*row) for row in rows}
+
+    def _read_one(self, key: str) -> Optional[GeocodeEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT address, lat, lon, status, updated_at, query FROM geocode WHERE address = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = self._to_entry(*row)
+            self._entries[key] = entry
+            self.version += 1
+        return entry
+
+    def entry(self, address: str) -> Optional[GeocodeEntry]:
+        """Typed entry for an address, or None if it has never been looked up"""
+        key = self.key_func(address)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._read_one(key)
+        return entry
+
+    def __contains__(self, address: str) -> bool:
+        return self.entry(address) is not None
+
+    def __getitem__(self, address: str) -> Coordinates:
+        entry = self.entry(address)
+        if entry is None:
+            raise KeyError(address)
+        return entry.coords
+
+    def __setitem__(self, address: str, coords: Coordinates):
+        self.put(address, coords)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def get(self, address: str, default: Coordinates = None) -> Coordinates:
+        try:
+            return self[address]
+        except KeyError:
+            return default
+
+    def items(self):
+        with self._lock:
+            return [(key, entry.coords) for key, entry in self._entries.items()]
+
+    def put(self, address: str, coords: Coordinates, status: Optional[str] = None):
+        """Insert or replace one entry in its own atomic transaction"""
+        key = self.key_func(address)
+        status = status or (FOUND if coords else NOT_FOUND)
+        lat, lon = (coords[0], coords[1]) if coords else (None, None)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocode (address, lat, lon, status, updated_at, query)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, lat, lon, status, now, address)
+                )
+            self._entries[key] = GeocodeEntry((lat, lon) if coords else None, status, now, address)
+            self.version += 1
+            self._writes_since_compact += 1
+            if self._writes_since_compact >= self.compact_every:
+                self.compact()
+
+    def expired_entries(self, ttls: Dict[str, float]) -> List[GeocodeEntry]:
+        """Entries whose status TTL has run out, oldest first"""
+        now = time.time()
+        with self._lock:
+            expired = [entry for entry in self._entries.values() if entry.is_expired(ttls, now)]
+        return sorted(expired, key=lambda entry: entry.updated_at)
+
+    def compact(self):
+        """Fold the write-ahead log back into the main database file and refresh the JSON export"""
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.execute("PRAGMA optimize")
+            except sqlite3.OperationalError as e:
+                # Another process holds a read lock; try again after more writes
+                print(f"Error compacting geocode store: {e}")
+            self._writes_since_compact = 0
+            if self.export_path:
+                try:
+                    self.export_json(self.export_path)
+                except Exception as e:
+                    print(f"Error saving cache: {e}")
+
+    def export_json(self, path: str):
+        """
+        Write the settled rows in the database to a JSON snapshot, including
+        rows other processes wrote. Errors and approximate fallbacks are left
+        out: the snapshot seeds new stores, which would otherwise treat them
+        as settled.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT address, lat, lon FROM geocode WHERE status IN (?, ?) ORDER BY address", (FOUND, NOT_FOUND)
+            ).fetchall()
+        write_json_cache(path, {key: (lat, lon) if lat is not None else None for key, lat, lon in rows})
@@ -0,0 +1,406 @@
+import csv
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from addresses import ZIP_PATTERN, normalize_address, simplify_address
+from geocode_store import APPROXIMATE, ERROR, FOUND, NOT_FOUND
+
+Coordinates = Optional[Tuple[float, float]]
+
+
+class _Pending:
+    """Sentinel returned by non-blocking lookups that are still resolving"""
+
+    def __repr__(self):
+        return 'PENDING'
+
+    def __bool__(self):
+        return False
+
+
+PENDING = _Pending()
+
+# GeocodeWorker priorities: addresses a parent is searching from go first
+USER_PRIORITY = 0
+BACKGROUND_PRIORITY = 1
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    `rate` tokens are added per second up to `capacity`; acquire() blocks
+    until a token is available.
+    """
+
+    def __init__(self, rate: float = 1.0, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeocodeWorker:
+    """
+    Background thread that resolves addresses one at a time.
+    `resolver(address)` does the actual lookup and stores the result; the
+    worker only queues requests, drops duplicates that are already queued,
+    and signals waiters when an address has been resolved. Requests are
+    deduplicated on `key_func(address)`, so equivalent spellings queued at
+    the same time share one lookup. Lower `priority` values are resolved
+    first (a parent's own address ahead of program addresses queued at load);
+    resubmitting a queued address with a lower value moves it up. When the queue
+    has been idle for `idle_interval` seconds, `idle_callback()` runs on the
+    worker thread (used to sweep expired cache entries).
+    """
+
+    def __init__(self, resolver: Callable[[str], object], idle_callback: Optional[Callable[[], None]] = None,
+                 idle_interval: float = 600.0, key_func: Callable[[str], str] = lambda address: address):
+        self._resolver = resolver
+        self._key_func = key_func
+        self._idle_callback = idle_callback
+        self._idle_interval = idle_interval
+        self._queue: "queue.PriorityQueue[Tuple[int, int, str]]" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending: Dict[str, Tuple[threading.Event, int]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='geocode-worker', daemon=True)
+            self._thread.start()
+
+    def start(self):
+        """Start the worker thread ahead of the first submit"""
+        with self._lock:
+            self._ensure_started()
+
+    def submit(self, address: str, priority: int = BACKGROUND_PRIORITY) -> threading.Event:
+        """Queue an address (once per priority) and return an event set when it resolves"""
+        key = self._key_func(address)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None or priority < pending[1]:
+                event = pending[0] if pending is not None else threading.Event()
+                self._pending[key] = (event, priority)
+                # A lower-priority copy left in the queue is skipped once this one resolves
+                self._queue.put((priority, next(self._sequence), address))
+            else:
+                event = pending[0]
+            self._ensure_started()
+        return event
+
+    def is_pending(self, address: str) -> bool:
+        with self._lock:
+            return self._key_func(address) in self._pending
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            try:
+                _, _, address = self._queue.get(timeout=self._idle_interval)
+            except queue.Empty:
+                if self._idle_callback is not None:
+                    try:
+                        self._idle_callback()
+                    except Exception as e:
+                        print(f"Error in geocode worker idle task: {str(e)}")
+                continue
+            key = self._key_func(address)
+            with self._lock:
+                if key not in self._pending:
+                    continue
+            try:
+                self._resolver(address)
+            except Exception as e:
+                print(f"Error in geocode worker for {address}: {str(e)}")
+            finally:
+                with self._lock:
+                    pending = self._pending.pop(key, None)
+                if pending is not None:
+                    pending[0].set()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency.
+    Closed: calls go through. After `failure_threshold` consecutive failures
+    the breaker opens and calls are refused for `reset_timeout` seconds; then
+    it goes half-open and lets one trial call decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected_calls = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True if a call may go ahead"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at >= self.reset_timeout:
+                    self.state = 'half-open'
+                    return True
+                self.rejected_calls += 1
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.total_successes += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            if self.state == 'half-open' or self.consecutive_failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, object]:
+        """Counters and state for instrumentation"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'total_failures': self.total_failures,
+                'total_successes': self.total_successes,
+                'rejected_calls': self.rejected_calls,
+            }
+
+
+def build_http_session(user_agent: str, pool_size: int = 4) -> requests.Session:
+    """Shared keep-alive session with a small connection pool"""
+    session = requests.Session()
+    session.headers.update({'User-Agent': user_agent})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class GeocoderBackend:
+    """
+    One way of turning an address into coordinates.
+    geocode() returns (lat, lon), or None when the backend has no match, and
+    raises when the lookup itself failed. `remote` marks backends that need
+    the network and must go through the rate limiter; `approximate` marks
+    backends whose matches are only roughly placed (ZIP centroids).
+    locate() also reports whether this particular match is approximate.
+    """
+    name = 'backend'
+    remote = False
+    approximate = False
+
+    def geocode(self, address: str) -> Coordinates:
+        raise NotImplementedError
+
+    def locate(self, address: str) -> Tuple[Coordinates, bool]:
+        return self.geocode(address), self.approximate
+
+
+class GazetteerBackend(GeocoderBackend):
+    """
+    Offline lookup against a bundled CSV table with columns
+    address, zip, lat, lon, approximate. Rows with an address match on the
+    normalized address; rows with only a zip are used as ZIP centroids when
+    `use_zip_centroids` is set. Address rows with `approximate` set were
+    placed by hand rather than geocoded, so their matches are approximate.
+    """
+    name = 'gazetteer'
+
+    def __init__(self, path: str, use_zip_centroids: bool = False):
+        self.path = path
+        self.use_zip_centroids = use_zip_centroids
+        if use_zip_centroids:
+            self.name = 'zip-centroid'
+            self.approximate = True
+        self.addresses: Dict[str, Tuple[float, float]] = {}
+        self.approximate_addresses = set()
+        self.zip_centroids: Dict[str, Tuple[float, float]] = {}
+        if os.path.exists(path):
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    coords = (float(row['lat']), float(row['lon']))
+                    if row.get('address'):
+                        key = normalize_address(row['address'])
+                        self.addresses[key] = coords
+                        if row.get('approximate'):
+                            self.approximate_addresses.add(key)
+                    elif row.get('zip'):
+                        self.zip_centroids[row['zip'].strip()] = coords
+
+    def geocode(self, address: str) -> Coordinates:
+        return self.locate(address)[0]
+
+    def locate(self, address: str) -> Tuple[Coordinates, bool]:
+        key = normalize_address(address)
+        coords = self.addresses.get(key)
+        if coords is not None:
+            return coords, self.approximate or key in self.approximate_addresses
+        if self.use_zip_centroids:
+            match = ZIP_PATTERN.search(address.strip())
+            if match:
+                coords = self.zip_centroids.get(match.group(0).strip()[:5])
+        return coords, self.approximate
+
+
+class NominatimBackend(GeocoderBackend):
+    """
+    OpenStreetMap Nominatim search API.
+    Requests share one pooled session with connect/read timeouts. Timeouts,
+    connection errors, 429 and 5xx responses are retried with jittered
+    exponential backoff; a lookup that still fails counts against the
+    circuit breaker, and while it is open no requests are made. Any other
+    4xx response means the query was rejected and is treated as no match.
+    Tries simplified address if full address fails (removes floor/suite info).
+    """
+    name = 'nominatim'
+    remote = True
+    search_url = "https://nominatim.openstreetmap.org/search"
+    user_agent = 'AfterSchoolProgramFinder/1.0'
+
+    def __init__(self, rate_limiter: TokenBucket, session: Optional[requests.Session] = None,
+                 breaker: Optional[CircuitBreaker] = None, timeout: Tuple[float, float] = (3.05, 10.0),
+                 max_retries: int = 2, backoff: float = 0.5):
+        self.rate_limiter = rate_limiter
+        self.session = session or build_http_session(self.user_agent)
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _get(self, params: dict) -> Optional[requests.Response]:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+
+        for attempt in range(self.max_retries + 1):
+            # Rate limiting - be nice to the API
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(self.search_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    self.breaker.record_success()
+                    if response.status_code >= 400:
+                        # Other 4xx responses reject the query itself: retrying will not help
+                        print(f"{self.name} rejected {params.get('q')}: {response.status_code}")
+                        return None
+                    return response
+                error = requests.HTTPError(f"{response.status_code} from {self.name}", response=response)
+
+            if attempt < self.max_retries:
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+        self.breaker.record_failure()
+        raise error
+
+    def _search(self, query: str) -> Coordinates:
+        params = {
+            'q': query,
+            'format': 'json',
+            'limit': 1
+        }
+        response = self._get(params)
+        results = response.json() if response is not None else None
+        if results:
+            return (float(results[0]['lat']), float(results[0]['lon']))
+        return None
+
+    def geocode(self, address: str) -> Coordinates:
+        coords = self._search(address)
+        if coords is None:
+            simplified = simplify_address(address)
+            if simplified != address:
+                coords = self._search(simplified)
+        return coords
+
+
+class GeocoderChain:
+    """
+    Ordered list of backends; the first one that finds the address wins.
+    A backend that raises is logged and skipped so later backends still run.
+    With remote=False the chain stops at the first remote backend, so only
+    the cheap local resolvers ahead of it are consulted.
+    """
+
+    def __init__(self, backends: List[GeocoderBackend]):
+        self.backends = backends
+
+    def lookup(self, address: str, remote: bool = True) -> Tuple[Coordinates, str]:
+        """
+        Resolve an address and classify the outcome: FOUND, NOT_FOUND when
+        every backend answered without a match, or ERROR when nothing matched
+        and at least one backend failed (so a retry may still succeed). A match
+        from an approximate backend or row, or from a later backend after an
+        earlier one failed, is APPROXIMATE: a better answer may turn up (the
+        failed backend recovers, or the gazetteer gains a geocoded row), so it
+        is retried too. An approximate match is kept only if no later backend
+        finds the address exactly.
+        """
+        failed = False
+        fallback = None
+        for backend in self.backends:
+            if backend.remote and not remote:
+                break
+            try:
+                coords, approximate = backend.locate(address)
+            except CircuitOpenError:
+                failed = True
+                continue
+            except Exception as e:
+                print(f"Error geocoding address {address} with {backend.name}: {str(e)}")
+                failed = True
+                continue
+            if coords and (approximate or failed):
+                fallback = fallback or coords
+            elif coords:
+                return coords, FOUND
+        if fallback:
+            return fallback, APPROXIMATE
+        return None, ERROR if failed else NOT_FOUND
+
+    def geocode(self, address: str, remote: bool = True) -> Coordinates:
+        return self.lookup(address, remote=remote)[0]
@@ -4,7 +4,7 @@ import folium
 from streamlit_folium import st_folium
 from datetime import datetime
 import time
-from utils import filter_programs, geocode_address, load_and_process_data, get_unique_values, get_category_icon, get_distance_badge_info, get_availability_status
+from utils import MaskCache, compute_facets, file_content_hash, filter_programs, get_program_id, join_saved_schedules, build_saved_program_index, saved_schedules_signature, geocode_address, refresh_coordinates, pending_geocode_count, load_compiled_data, get_unique_values, get_category_icon, get_distance_badge_info, get_availability_status
 
 # Force light theme configuration
 st.set_page_config(
@@ -98,6 +98,13 @@ button {
 """, unsafe_allow_html=True)
 
 # Helper functions for display
+def availability_badge(program, font_size='0.7rem'):
+    """Colored badge for programs without open spots (e.g. Waitlist); empty when spots are open"""
+    status, color = get_availability_status(program)
+    if status == 'Spots Open':
+        return ''
+    return f'<span style="font-size: {font_size}; background: {color}; color: white; padding: 4px 10px; border-radius: 12px; margin-right: 4px; font-weight: 600;">⏳ {status}</span>'
+
 def display_program_card(program):
     """Display a program as a card in list view"""
     with st.container():
@@ -118,7 +125,7 @@ def display_program_card(program):
             <h3 class='program-card-title'>{program.get('Program Name', 'N/A')}</h3>
             <p class='program-card-provider'>{program.get('Provider Name', 'N/A')}</p>
             <div style='margin: 8px 0;'>
-                {type_badge}
+                {type_badge}{availability_badge(program, '0.75rem')}
             </div>
             <div class='program-card-info-bar'>
                 <p class='program-card-text'><span style='margin-right: 8px;'>⏰</span>{program.get('Day of the week', 'N/A')} • {program.get('Start time', 'N/A')} - {program.get('End time', 'N/A')}</p>"""
@@ -240,13 +247,39 @@ def format_duration(minutes):
             return f"({hours}h {mins}m)"
 
 
+def _saved_schedules_signature():
+    return saved_schedules_signature(st.session_state.saved_schedules)
+
+def get_saved_program_index():
+    """
+    Map of program_id -> set of schedule names holding it, for O(1) saved checks.
+    Kept in sync by add_program_to_schedule and remove_program_from_schedule;
+    rebuilt when missing or when saved_schedules was replaced or edited elsewhere
+    (e.g. restored session state).
+    """
+    signature = _saved_schedules_signature()
+    if ('saved_program_index' not in st.session_state
+            or st.session_state.get('saved_program_index_signature') != signature):
+        st.session_state.saved_program_index = build_saved_program_index(st.session_state.saved_schedules)
+        st.session_state.saved_program_index_signature = signature
+    return st.session_state.saved_program_index
+
+def saved_schedule_names(program):
+    """Schedule names the program is saved in, in schedule order"""
+    names = get_saved_program_index().get(get_program_id(program))
+    if not names:
+        return []
+    return [name for name in st.session_state.saved_schedules if name in names]
+
 def add_program_to_schedule(program, schedule_name):
     """Add a program to a named schedule"""
+    index = get_saved_program_index()
     if schedule_name not in st.session_state.saved_schedules:
         st.session_state.saved_schedules[schedule_name] = []
     
     # Create program data dictionary
     program_data = {
+        'program_id': get_program_id(program),
         'Program Name': program.get('Program Name', 'N/A'),
         'Provider Name': program.get('Provider Name', 'N/A'),
         'Day of the week': program.get('Day of the week', ''),
@@ -263,18 +296,31 @@ def add_program_to_schedule(program, schedule_name):
         'Contact Phone': program.get('Contact Phone', ''),
     }
     
-    # Check if program already exists in schedule (match by name, provider, day, and time)
-    existing_programs = st.session_state.saved_schedules[schedule_name]
-    for existing in existing_programs:
-        if (existing['Program Name'] == program_data['Program Name'] and 
-            existing['Provider Name'] == program_data['Provider Name'] and
-            existing['Day of the week'] == program_data['Day of the week'] and
-            existing['Start time'] == program_data['Start time']):
-            return False  # Already exists
+    # Check if program already exists in schedule (program_id hashes name, provider, day, and time)
+    if schedule_name in index.get(program_data['program_id'], ()):
+        st.session_state.saved_program_index_signature = _saved_schedules_signature()
+        return False  # Already exists
     
     st.session_state.saved_schedules[schedule_name].append(program_data)
+    index.setdefault(program_data['program_id'], set()).add(schedule_name)
+    st.session_state.saved_program_index_signature = _saved_schedules_signature()
     return True
 
+def remove_program_from_schedule(program, schedule_name):
+    """Remove a program from a named schedule"""
+    index = get_saved_program_index()
+    program_id = get_program_id(program)
+    st.session_state.saved_schedules[schedule_name] = [
+        p for p in st.session_state.saved_schedules[schedule_name]
+        if get_program_id(p) != program_id
+    ]
+    names = index.get(program_id)
+    if names is not None:
+        names.discard(schedule_name)
+        if not names:
+            del index[program_id]
+    st.session_state.saved_program_index_signature = _saved_schedules_signature()
+
 def detect_schedule_conflicts(schedule_name):
     """Detect time conflicts within a schedule"""
     if schedule_name not in st.session_state.saved_schedules:
@@ -314,47 +360,9 @@ def filter_programs_by_schedule(filtered_df, schedule_name):
         if not st.session_state.saved_schedules:
             return filtered_df.iloc[0:0]  # Return empty dataframe
         
-        # Collect all programs from all schedules with schedule labels
-        family_programs = []
-        for sched_name, programs in st.session_state.saved_schedules.items():
-            for prog in programs:
-                # Add schedule name to program data for Family View
-                prog_with_schedule = prog.copy()
-                prog_with_schedule['Schedule_Name'] = sched_name
-                family_programs.append(prog_with_schedule)
-        
-        if not family_programs:
-            return filtered_df.iloc[0:0]
-        
-        # Create DataFrame from family programs
-        family_df = pd.DataFrame(family_programs)
-        
-        # Filter original dataframe to match family programs
-        saved_program_keys = set()
-        for prog in family_programs:
-            key = f"{prog['Program Name']}|{prog['Provider Name']}|{prog['Day of the week']}|{prog['Start time']}"
-            saved_program_keys.add(key)
-        
         try:
-            mask = filtered_df.apply(lambda row: 
-                f"{row.get('Program Name', 'N/A')}|{row.get('Provider Name', 'N/A')}|{row.get('Day of the week', 'N/A')}|{row.get('Start time', 'N/A')}" in saved_program_keys, 
-                axis=1
-            )
-            
-            result_df = filtered_df.loc[mask.fillna(False)].copy()
-            
-            # Add schedule names to the result dataframe
-            if not result_df.empty:
-                result_df['Schedule_Name'] = result_df.apply(lambda row: 
-                    next((prog['Schedule_Name'] for prog in family_programs 
-                          if (prog['Program Name'] == row.get('Program Name', 'N/A') and 
-                              prog['Provider Name'] == row.get('Provider Name', 'N/A') and
-                              prog['Day of the week'] == row.get('Day of the week', 'N/A') and
-                              prog['Start time'] == row.get('Start time', 'N/A'))), ''), 
-                    axis=1
-                )
-            
-            return result_df
+            # Labelled with every schedule the program is saved in
+            return join_saved_schedules(filtered_df, st.session_state.saved_schedules)
             
         except Exception as e:
             print(f"Error filtering family programs: {e}")
@@ -372,21 +380,12 @@ def filter_programs_by_schedule(filtered_df, schedule_name):
     if not saved_programs:  # Handle empty schedule
         return filtered_df.iloc[0:0]  # Return empty dataframe with same structure
     
-    saved_program_keys = set()
-    
-    for prog in saved_programs:
-        key = f"{prog['Program Name']}|{prog['Provider Name']}|{prog['Day of the week']}|{prog['Start time']}"
-        saved_program_keys.add(key)
+    saved_program_ids = {get_program_id(prog) for prog in saved_programs}
     
     # Filter the dataframe to only include saved programs (match by name, provider, day, and time)
     try:
-        mask = filtered_df.apply(lambda row: 
-            f"{row.get('Program Name', 'N/A')}|{row.get('Provider Name', 'N/A')}|{row.get('Day of the week', 'N/A')}|{row.get('Start time', 'N/A')}" in saved_program_keys, 
-            axis=1
-        )
-        
         # Use .loc to avoid ambiguous boolean indexing
-        return filtered_df.loc[mask.fillna(False)]
+        return filtered_df.loc[filtered_df['program_id'].isin(saved_program_ids)]
         
     except Exception as e:
         # If there's an error with filtering, return all programs
@@ -421,40 +420,25 @@ def program_details_modal():
         st.markdown(f"### {icon} {program.get('Program Name', 'N/A')}")
         st.markdown(f"{program.get('Provider Name', 'N/A')}")
         
-        # Show distance badge only (availability status removed as it's now on cards)
+        # Show distance badge, and availability when spots aren't open (e.g. waitlisted programs)
+        badges_html = availability_badge(program, '0.8rem')
         if distance_text:
             # Use warm terra cotta styling for distance badges - friendly and distinct
-            distance_badge = f'<span style="font-size: 0.8rem; background: var(--distance-color); color: #2C3E50; padding: 5px 12px; border-radius: 20px; margin-right: 6px; font-weight: 500; box-shadow: 0 2px 4px rgba(221, 107, 32, 0.3);">🏠 {distance_text}</span>'
-            st.markdown(distance_badge, unsafe_allow_html=True)
+            badges_html += f'<span style="font-size: 0.8rem; background: var(--distance-color); color: #2C3E50; padding: 5px 12px; border-radius: 20px; margin-right: 6px; font-weight: 500; box-shadow: 0 2px 4px rgba(221, 107, 32, 0.3);">🏠 {distance_text}</span>'
+        if badges_html:
+            st.markdown(badges_html, unsafe_allow_html=True)
     
     with col2:
         # Quick save button
         current_schedule = st.session_state.current_schedule
         is_saved = False
         if current_schedule != "All Programs" and current_schedule in st.session_state.saved_schedules:
-            prog_name = str(program.get('Program Name', ''))
-            prog_provider = str(program.get('Provider Name', ''))
-            prog_day = str(program.get('Day of the week', ''))
-            prog_time = str(program.get('Start time', ''))
-            
-            for saved_prog in st.session_state.saved_schedules[current_schedule]:
-                if (saved_prog['Program Name'] == prog_name and 
-                    saved_prog['Provider Name'] == prog_provider and
-                    saved_prog['Day of the week'] == prog_day and
-                    saved_prog['Start time'] == prog_time):
-                    is_saved = True
-                    break
+            is_saved = current_schedule in saved_schedule_names(program)
         
         if is_saved:
             if st.button("💖 Saved", type="secondary", use_container_width=True):
                 # Remove from schedule
-                st.session_state.saved_schedules[current_schedule] = [
-                    p for p in st.session_state.saved_schedules[current_schedule]
-                    if not (p['Program Name'] == prog_name and 
-                           p['Provider Name'] == prog_provider and
-                           p['Day of the week'] == prog_day and
-                           p['Start time'] == prog_time)
-                ]
+                remove_program_from_schedule(program, current_schedule)
                 st.success(f"Removed from {current_schedule}")
                 st.rerun()
         else:
@@ -923,11 +907,8 @@ def display_mobile_schedule_view(filtered_df):
         st.info(f"📅 No programs found for {selected_day}.\n\nTry selecting a different day or adjusting your filters.")
         return
     
-    # Sort programs by start time
-    day_programs['start_time_minutes'] = day_programs['Start time'].apply(
-        lambda x: parse_time(x) if pd.notna(x) and str(x).strip() else 0
-    )
-    day_programs = day_programs.sort_values('start_time_minutes')
+    # Sort programs by start time (minutes precomputed at load)
+    day_programs = day_programs.sort_values('start_min')
     
     # Get current schedule name for combined header
     current_schedule = st.session_state.get('current_schedule', 'Schedule')
@@ -972,16 +953,7 @@ def display_mobile_schedule_view(filtered_df):
                 type_badge_text = ''
 
             # Check if program is already saved to any schedule
-            program_key = f"{program_name}|{provider_name}|{program.get('Day of the week', '')}|{start_time}"
-            is_saved = False
-            for schedule_programs in st.session_state.saved_schedules.values():
-                for saved_prog in schedule_programs:
-                    saved_key = f"{saved_prog.get('Program Name', '')}|{saved_prog.get('Provider Name', '')}|{saved_prog.get('Day of the week', '')}|{saved_prog.get('Start time', '')}"
-                    if saved_key == program_key:
-                        is_saved = True
-                        break
-                if is_saved:
-                    break
+            is_saved = bool(saved_schedule_names(program))
             
             # Show heart icon if saved
             if is_saved:
@@ -1013,6 +985,11 @@ def display_mobile_schedule_view(filtered_df):
             # Add program location badge
             if type_badge_text:
                 card_content += f"\n📍 {type_badge_text}"
+
+            # Flag programs without open spots (e.g. waitlisted)
+            availability_status, _ = get_availability_status(program)
+            if availability_status != 'Spots Open':
+                card_content += f"\n⏳ {availability_status}"
             
             # Program info and save button on one line
             col1, col2 = st.columns([3, 1])
@@ -1054,11 +1031,7 @@ def display_schedule_grid(filtered_df):
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
     
     # Extract all unique start times from programs
-    unique_start_times = set()
-    for _, program in filtered_df.iterrows():
-        start_time = parse_time(program.get('Start time'))
-        if start_time > 0:
-            unique_start_times.add(start_time)
+    unique_start_times = set(int(minutes) for minutes in filtered_df['start_min'].unique() if minutes > 0)
     
     # Sort unique start times chronologically
     time_slots = sorted(list(unique_start_times))
@@ -1075,7 +1048,7 @@ def display_schedule_grid(filtered_df):
     # Populate programs into their exact start time slots
     for _, program in filtered_df.iterrows():
         day = program.get('Day of the week', '').strip()
-        start_time = parse_time(program.get('Start time'))
+        start_time = int(program['start_min'])
         if day in programs_by_day_time and start_time in programs_by_day_time[day]:
             programs_by_day_time[day][start_time].append(program)
     
@@ -1155,22 +1128,17 @@ def display_schedule_grid(filtered_df):
                             type_badge = ''
 
                         # Check if program is saved
-                        is_saved = False
+                        schedule_names = saved_schedule_names(program)
                         current_schedule = st.session_state.current_schedule
-                        if current_schedule != "All Programs" and current_schedule in st.session_state.saved_schedules:
-                            for saved_prog in st.session_state.saved_schedules[current_schedule]:
-                                if (saved_prog['Program Name'] == program_name and 
-                                    saved_prog['Provider Name'] == provider_name and
-                                    saved_prog['Day of the week'] == program.get('Day of the week', '') and
-                                    saved_prog['Start time'] == program.get('Start time', '')):
-                                    is_saved = True
-                                    break
+                        is_saved = current_schedule != "All Programs" and current_schedule in schedule_names
                         
                         # Create visual badges for program type and distance
                         badges_html = ""
                         # Program location badge first
                         if type_badge:
                             badges_html += type_badge
+                        # Availability when spots aren't open (e.g. waitlisted)
+                        badges_html += availability_badge(program)
                         # Distance badge last
                         if distance_text:
                             badges_html += f'<span style="font-size: 0.7rem; background: var(--distance-color); color: #2C3E50; padding: 4px 10px; border-radius: 15px; font-weight: 500;">🚶‍♀️ {distance_text}</span>'
@@ -1179,15 +1147,7 @@ def display_schedule_grid(filtered_df):
                         saved_class = "saved" if is_saved else ""
                         
                         # Check if this SPECIFIC program (including day/time) is already in any saved schedule
-                        in_schedule = None
-                        for schedule_name, schedule_programs in st.session_state.saved_schedules.items():
-                            if any(prog.get('Program Name') == program_name and 
-                                  prog.get('Provider Name') == provider_name and
-                                  prog.get('Day of the week') == program.get('Day of the week', '') and
-                                  prog.get('Start time') == program.get('Start time', '')
-                                  for prog in schedule_programs):
-                                in_schedule = schedule_name
-                                break
+                        in_schedule = schedule_names[0] if schedule_names else None
                         
                         # Clickable program card with hover effects
                         card_container = st.container()
@@ -1260,10 +1220,18 @@ if 'user_address' not in st.session_state:
     st.session_state.user_address = ""
 if 'max_distance' not in st.session_state:
     st.session_state.max_distance = 1.0
+if 'include_waitlist' not in st.session_state:
+    st.session_state.include_waitlist = False
 if 'filtered_df' not in st.session_state:
     st.session_state.filtered_df = None
+if 'filter_notices' not in st.session_state:
+    # Filters from the last search that could not be applied, e.g. distance while the address is located
+    st.session_state.filter_notices = []
 if 'submitted' not in st.session_state:
     st.session_state.submitted = False
+if 'filter_masks' not in st.session_state:
+    # Per-predicate masks from this session's earlier searches
+    st.session_state.filter_masks = MaskCache()
 # Removed view_mode - only showing schedule view now
 if 'saved_schedules' not in st.session_state:
     st.session_state.saved_schedules = {}
@@ -1421,16 +1389,24 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Load data
-try:
-    df = load_and_process_data("attached_assets/ProgramData.csv")
+PROGRAM_DATA_FILE = "attached_assets/ProgramData.csv"
 
-    # Filter to show only programs with spots open (hide waitlist and full programs)
-    def has_spots_open(program):
-        availability_status, _ = get_availability_status(program)
-        return availability_status == "Spots Open"
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_program_data(file_path, content_hash):
+    """
+    Processed program data, loaded once per process and shared read-only by
+    every session and rerun. `content_hash` is only part of the cache key, so
+    editing the CSV loads it again.
+    """
+    return load_compiled_data(file_path)
 
-    df = df[df.apply(has_spots_open, axis=1)].reset_index(drop=True)
+def availability_levels(include_waitlist):
+    """Availability filter: programs with spots open, plus waitlisted ones on request (full programs stay hidden)"""
+    return ['Spots Open', 'Waitlist'] if include_waitlist else ['Spots Open']
+
+# Load data
+try:
+    df = load_program_data(PROGRAM_DATA_FILE, file_content_hash(PROGRAM_DATA_FILE))
 
     # Get unique values for filters
     interest_categories = get_unique_values(df, 'Interest Category')
@@ -1454,6 +1430,26 @@ try:
         if hour < 8:  # Don't add 8:30 PM since we stop at 8:00 PM
             time_options.append(f"{hour:02d}:30 PM")
 
+    # Result counts per option for the last submitted filters, shown next to each option.
+    # They are informational only: other fields may change in the same submit.
+    facets = compute_facets(df, {
+        'child_age': st.session_state.child_age,
+        'grade_level': st.session_state.grade_level,
+        'program_types': st.session_state.program_types,
+        'selected_interests': st.session_state.selected_interests,
+        'selected_days': st.session_state.selected_days,
+        'start_time': st.session_state.start_time,
+        'end_time': st.session_state.end_time,
+        'user_address': st.session_state.user_address,
+        'max_distance': st.session_state.max_distance,
+        'availability': availability_levels(st.session_state.include_waitlist)
+    }, masks=st.session_state.filter_masks)
+    interest_counts = facets.get('selected_interests', {})
+    day_counts = facets.get('selected_days', {})
+    program_type_counts = facets.get('program_types', {})
+    grade_counts = facets.get('grade_level', {})
+    availability_counts = facets.get('availability', {})
+
     # Create form with improved organization
     with st.form(key='program_filter_form'):
         # Child Information Section
@@ -1475,6 +1471,7 @@ try:
                 "Child's Grade Level",
                 options=grade_options,
                 index=grade_options.index(st.session_state.grade_level) if st.session_state.grade_level in grade_options else 2,
+                format_func=lambda grade: f"{grade} ({grade_counts.get(grade, 0)})",
                 help="Select grade level for on-site school programs (optional)"
             )
 
@@ -1484,18 +1481,25 @@ try:
         program_type_col1, program_type_col2 = st.columns(2)
         with program_type_col1:
             on_site_checked = st.checkbox(
-                "On-site (School-based)",
+                f"On-site (School-based) ({program_type_counts.get('On-site', 0)})",
                 value='On-site' in st.session_state.program_types,
                 key="on_site_checkbox",
                 help="• On-site: School-based programs by World Explorers • Off-site: External venues"
             )
         with program_type_col2:
             off_site_checked = st.checkbox(
-                "Off-site (External locations)",
+                f"Off-site (External locations) ({program_type_counts.get('Off-site', 0)})",
                 value='Off-site' in st.session_state.program_types,
                 key="off_site_checkbox"
             )
 
+        include_waitlist = st.checkbox(
+            f"Include waitlisted programs ({availability_counts.get('Waitlist', 0)})",
+            value=st.session_state.include_waitlist,
+            key="include_waitlist_checkbox",
+            help="Also show programs that are full but taking waitlist sign-ups"
+        )
+
         # Build program_types list based on checkboxes
         program_types = []
         if on_site_checked:
@@ -1509,6 +1513,7 @@ try:
             "What activities interest your child?",
             options=interest_categories,
             default=st.session_state.selected_interests,
+            format_func=lambda category: f"{category} ({interest_counts.get(category, 0)})",
             help="Select one or more categories that match your child's interests"
         )
         
@@ -1574,8 +1579,9 @@ try:
         
         for day in days_of_week:
             is_selected = day in st.session_state.selected_days
+            # Counts are for the last submitted filters, so options stay selectable
             if st.checkbox(
-                day, 
+                f"{day} ({day_counts.get(day, 0)})",
                 value=is_selected, 
                 key=f"day_{day}"
             ):
@@ -1597,6 +1603,7 @@ try:
             st.session_state.end_time = end_time
             st.session_state.user_address = user_address
             st.session_state.max_distance = max_distance
+            st.session_state.include_waitlist = include_waitlist
             st.session_state.submitted = True
             
             # Create mobile-friendly progress indicator
@@ -1669,7 +1676,8 @@ try:
                 'start_time': start_time,
                 'end_time': end_time,
                 'user_address': user_address,
-                'max_distance': max_distance
+                'max_distance': max_distance,
+                'availability': availability_levels(include_waitlist)
             }
 
             # Close program details modal when filters change
@@ -1681,7 +1689,8 @@ try:
                 st.session_state.show_program_details = False
                 st.session_state.previous_filters = current_filters_str
 
-            filtered_df = filter_programs(df, filters)
+            filter_notices = []
+            filtered_df = filter_programs(df, filters, masks=st.session_state.filter_masks, notices=filter_notices)
             
             # Step 3: Loading schedules
             progress_container.markdown("""
@@ -1765,6 +1774,9 @@ try:
             progress_container.empty()  # Clear the progress indicator
             
             st.session_state.filtered_df = filtered_df
+            st.session_state.filter_notices = filter_notices
+            # Rerun so the option counts in the form reflect the filters just submitted
+            st.rerun()
 
     # Show results if form was submitted
     if st.session_state.submitted and st.session_state.filtered_df is not None:
@@ -1790,6 +1802,15 @@ try:
         </style>
         <div class="result-count-text">{result_text}</div>
         """, unsafe_allow_html=True)
+
+        # Filters that were requested but could not be applied
+        for notice in st.session_state.filter_notices:
+            st.warning(f"📍 {notice}")
+
+        # Let parents know some locations are still being looked up
+        pending_locations = pending_geocode_count()
+        if pending_locations > 0:
+            st.caption(f"📍 Still locating {pending_locations} program address{'es' if pending_locations != 1 else ''} - search again in a moment to include them in distance results and the map.")
         
         # Mobile-Optimized Navigation Bar  
         if len(filtered_df) > 0:
@@ -1873,12 +1894,11 @@ try:
         
         # Collapsible Map Section - Only show if toggle is enabled
         if len(filtered_df) > 0 and st.session_state.show_map:
-            # Get coordinates for all programs
+            # Get coordinates for all programs (resolved once at load time);
+            # addresses still being geocoded in the background are skipped
             program_coords = []
-            for _, program in filtered_df.iterrows():
-                prog_coords = geocode_address(program['Address'])
-                if prog_coords:
-                    program_coords.append((prog_coords, program))
+            for _, program in refresh_coordinates(filtered_df).dropna(subset=['lat', 'lon']).iterrows():
+                program_coords.append(((program['lat'], program['lon']), program))
             
             if program_coords:
                 # Map container with mobile-optimized styling
@@ -0,0 +1,282 @@
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class Predicate:
+    """
+    One filter condition evaluated as a boolean mask over a whole frame.
+    `params` identifies the condition (two predicates with the same name and
+    params always produce the same mask for the same data). `cost` is the
+    relative per-row evaluation cost and `selectivity` the estimated fraction
+    of rows kept; the planner uses both to decide evaluation order.
+    """
+    name = 'predicate'
+    cost = 1.0
+    selectivity = 0.5
+
+    def __init__(self, params: tuple):
+        self.params = params
+
+    @property
+    def key(self) -> tuple:
+        return (self.name, self.params)
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return a frame with the columns this predicate reads (without mutating `df`)"""
+        return df
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        raise NotImplementedError
+
+    def finalize(self, result: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+        """Decorate the materialized result (`positions` are its rows in the evaluated frame)"""
+        return result
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.params}"
+
+
+def rank(predicate: Predicate) -> float:
+    """
+    Ordering key: cheap predicates that discard many rows run first.
+    Classic cost / (1 - selectivity) ranking, so an expensive predicate is
+    only worth running early if it is correspondingly selective.
+    """
+    return predicate.cost / max(1.0 - predicate.selectivity, 1e-6)
+
+
+def order_predicates(predicates: List[Predicate]) -> List[Predicate]:
+    return sorted(predicates, key=rank)
+
+
+# Content fingerprints per frame, keyed by object identity
+_fingerprints: Dict[int, Tuple[weakref.ref, str]] = {}
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash of a frame's index and values, computed once per frame object and
+    dropped when the frame is garbage collected.
+    """
+    key = id(df)
+    cached = _fingerprints.get(key)
+    if cached is not None and cached[0]() is df:
+        return cached[1]
+
+    row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    digest = hashlib.blake2b(row_hashes.tobytes(), digest_size=16)
+    digest.update(repr(list(df.columns)).encode())
+    fingerprint = digest.hexdigest()
+    _fingerprints[key] = (weakref.ref(df, lambda _, key=key: _fingerprints.pop(key, None)), fingerprint)
+    return fingerprint
+
+
+class ResultCache:
+    """
+    Process-wide LRU cache of query results.
+    Entries are keyed by a hash of the dataset fingerprint and the planned
+    predicate keys (so equivalent filters dicts share an entry) and hold row
+    positions plus any columns the plan added (e.g. 'Distance') rather than
+    DataFrame copies. Least recently used entries are evicted once the stored
+    arrays exceed `max_bytes`. Safe to share between Streamlit sessions.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, Dict[str, np.ndarray], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(fingerprint: str, predicate_keys: List[tuple]) -> str:
+        canonical = repr((fingerprint, sorted(predicate_keys, key=repr)))
+        return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: str, positions: np.ndarray, columns: Dict[str, np.ndarray]):
+        size = positions.nbytes + sum(values.nbytes for values in columns.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (positions, columns, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, object]:
+        """Counters and size for instrumentation"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class MaskCache:
+    """
+    Per-session cache of predicate masks, keyed by the frame fingerprint and
+    each predicate's own key. When a parent changes one control and searches
+    again, only the changed predicate is evaluated; the other masks are
+    reused and ANDed. The evaluated predicate is kept with its mask so any
+    state finalize() needs (e.g. distances) comes along. Holds at most
+    `max_entries` masks, least recently used evicted first.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, Tuple[np.ndarray, Predicate]]" = OrderedDict()
+
+    def get(self, fingerprint: str, predicate: Predicate) -> Optional[Tuple[np.ndarray, Predicate]]:
+        key = (fingerprint, predicate.key)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, fingerprint: str, predicate: Predicate, mask: np.ndarray):
+        self._entries[(fingerprint, predicate.key)] = (mask, predicate)
+        self._entries.move_to_end((fingerprint, predicate.key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def execute_plan(df: pd.DataFrame, predicates: List[Predicate],
+                 explain: Optional[List[Dict[str, object]]] = None,
+                 cache: Optional[ResultCache] = None, masks: Optional[MaskCache] = None) -> pd.DataFrame:
+    """
+    Evaluate predicates in planned order as masks over `df`, AND them, and
+    materialize the matching rows once. Once no rows survive, the remaining
+    (more expensive) predicates are skipped. When `explain` is a list, one
+    record per step is appended with timings and row counts. With a `cache`,
+    results are looked up by the prepared frame's fingerprint and the
+    predicate keys before anything is evaluated; with `masks`, individual
+    predicate masks are reused from earlier queries.
+    """
+    plan = order_predicates(predicates)
+    started = time.perf_counter()
+    for predicate in plan:
+        df = predicate.prepare(df)
+    _record(explain, 'prepare', started, len(df), len(df))
+
+    fingerprint = frame_fingerprint(df) if cache is not None or masks is not None else None
+    cache_key = None
+    if cache is not None:
+        started = time.perf_counter()
+        cache_key = cache.make_key(fingerprint, [predicate.key for predicate in plan])
+        cached = cache.get(cache_key)
+        if cached is not None:
+            positions, columns = cached
+            result = df.iloc[positions].copy()
+            for column, values in columns.items():
+                result[column] = values
+            _record(explain, 'cache', started, len(df), len(result), hit=True)
+            return result
+        _record(explain, 'cache', started, len(df), len(df), hit=False)
+
+    keep = np.ones(len(df), dtype=bool)
+    rows_in = len(df)
+    for i, predicate in enumerate(plan):
+        started = time.perf_counter()
+        if not keep.any():
+            _record(explain, predicate.name, started, 0, 0, params=predicate.params, skipped=True)
+            continue
+        matched, plan[i], cached = _evaluate(df, predicate, masks, fingerprint)
+        keep &= matched
+        rows_out = int(keep.sum())
+        _record(explain, predicate.name, started, rows_in, rows_out,
+                params=predicate.params, matched=int(matched.sum()), cached=cached)
+        rows_in = rows_out
+
+    started = time.perf_counter()
+    positions = np.flatnonzero(keep)
+    result = df.iloc[positions].copy()
+    for predicate in plan:
+        result = predicate.finalize(result, positions)
+    _record(explain, 'materialize', started, len(df), len(result))
+
+    if cache_key is not None and df.index.is_unique:
+        # Store final row order (finalize may sort) and the columns it added
+        cache.put(cache_key, df.index.get_indexer(result.index),
+                  {column: result[column].to_numpy() for column in result.columns if column not in df.columns})
+    return result
+
+
+def evaluate_masks(df: pd.DataFrame, predicates: List[Predicate],
+                   masks: Optional[MaskCache] = None) -> Tuple[pd.DataFrame, List[Tuple[Predicate, np.ndarray]]]:
+    """
+    Prepare `df` for the predicates and evaluate every mask, without
+    short-circuiting, for callers that combine masks themselves (facets).
+    Returns the prepared frame and (predicate, mask) pairs.
+    """
+    for predicate in predicates:
+        df = predicate.prepare(df)
+    fingerprint = frame_fingerprint(df) if masks is not None else None
+    evaluated = []
+    for predicate in predicates:
+        matched, predicate, _ = _evaluate(df, predicate, masks, fingerprint)
+        evaluated.append((predicate, matched))
+    return df, evaluated
+
+
+def _evaluate(df: pd.DataFrame, predicate: Predicate, masks: Optional[MaskCache],
+              fingerprint: Optional[str]) -> Tuple[np.ndarray, Predicate, bool]:
+    """Mask for one predicate, from the mask cache when possible"""
+    cached = masks.get(fingerprint, predicate) if masks is not None else None
+    if cached is not None:
+        return cached[0], cached[1], True
+    matched = predicate.mask(df)
+    if masks is not None:
+        masks.put(fingerprint, predicate, matched)
+    return matched, predicate, False
+
+
+def _record(explain, step: str, started: float, rows_in: int, rows_out: int, **extra):
+    if explain is None:
+        return
+    record = {'step': step, 'ms': (time.perf_counter() - started) * 1000.0,
+              'rows_in': rows_in, 'rows_out': rows_out}
+    record.update(extra)
+    explain.append(record)
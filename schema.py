@@ -0,0 +1,150 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+VALID_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Canonical display format for time columns
+TIME_FORMAT = '%I:%M %p'
+# Accepted spellings of a time: '03:00 PM', '15:00' and '3:00PM'
+TIME_FORMATS = (TIME_FORMAT, '%H:%M', '%I:%M%p')
+
+
+class ColumnSpec(NamedTuple):
+    """
+    How one CSV column is parsed.
+    kind: 'str', 'int', 'float', 'money' ($ and thousands separators allowed),
+    'date', 'time' or 'day'. `formats` are strptime formats for dates/times;
+    later formats are only tried on values the earlier ones could not parse.
+    `minutes_column` names an integer minutes-since-midnight column derived
+    from a time column in the same pass.
+    """
+    name: str
+    kind: str = 'str'
+    required: bool = False
+    formats: Tuple[str, ...] = ()
+    minutes_column: Optional[str] = None
+
+
+class RowError(NamedTuple):
+    """One value that failed to parse; `row` is the CSV row number, counting the header as row 1"""
+    row: int
+    column: str
+    value: str
+    message: str
+
+
+PROGRAM_SCHEMA = [
+    ColumnSpec('Provider Name', required=True),
+    ColumnSpec('Website'),
+    ColumnSpec('Program Name', required=True),
+    ColumnSpec('Description'),
+    ColumnSpec('Day of the week', 'day', required=True),
+    ColumnSpec('Start time', 'time', required=True, formats=TIME_FORMATS, minutes_column='start_min'),
+    ColumnSpec('End time', 'time', required=True, formats=TIME_FORMATS, minutes_column='end_min'),
+    ColumnSpec('Start date', 'date', formats=('%m/%d/%Y', '%m/%d/%y')),
+    ColumnSpec('End date', 'date', formats=('%m/%d/%Y', '%m/%d/%y')),
+    ColumnSpec('Required Days/Week', 'int'),
+    ColumnSpec('Enrollment Type'),
+    # Ages may be fractional (e.g. 3.5)
+    ColumnSpec('Min Age', 'float'),
+    ColumnSpec('Max Age', 'float'),
+    ColumnSpec('Prerequisite'),
+    ColumnSpec('Cost', 'money'),
+    ColumnSpec('Number Class', 'int'),
+    ColumnSpec('Cost Per Class', 'money'),
+    ColumnSpec('Session Length', 'float'),
+    ColumnSpec('Cost Per Hour', 'money'),
+    ColumnSpec('Address'),
+    ColumnSpec('Interest Category', required=True),
+    ColumnSpec('Enrollment Status'),
+    ColumnSpec('Program Type'),
+    ColumnSpec('School Pickup From'),
+    ColumnSpec('Instructor Language'),
+    ColumnSpec('Contact Email'),
+    ColumnSpec('Contact Phone'),
+    ColumnSpec('Grade_Level'),
+]
+
+
+def _parse_datetimes(values: pd.Series, formats: Tuple[str, ...]) -> pd.Series:
+    parsed = pd.to_datetime(values, format=formats[0], errors='coerce')
+    for fmt in formats[1:]:
+        retry = parsed.isna() & values.notna()
+        if not retry.any():
+            break
+        parsed[retry] = pd.to_datetime(values[retry], format=fmt, errors='coerce')
+    return parsed
+
+
+def _convert(values: pd.Series, spec: ColumnSpec) -> Tuple[pd.Series, np.ndarray, str]:
+    """Parse one column; returns the parsed values, a mask of bad values and the error message"""
+    present = values.notna().to_numpy()
+
+    if spec.kind in ('int', 'float', 'money'):
+        text = values
+        if spec.kind == 'money':
+            text = values.str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+        parsed = pd.to_numeric(text.str.strip(), errors='coerce').astype(np.float64)
+        bad = present & parsed.isna().to_numpy()
+        if spec.kind == 'int':
+            bad |= (parsed.notna() & (parsed % 1 != 0)).to_numpy()
+            return parsed, bad, "expected a whole number"
+        return parsed, bad, "expected a number"
+
+    if spec.kind == 'date':
+        parsed = _parse_datetimes(values, spec.formats)
+        return parsed, present & parsed.isna().to_numpy(), f"expected a date like {spec.formats[0]}"
+
+    if spec.kind == 'time':
+        parsed = _parse_datetimes(values, spec.formats)
+        return parsed, parsed.isna().to_numpy(), f"expected a time like {spec.formats[0]}"
+
+    if spec.kind == 'day':
+        # Normalize day names (remove 's' from plural days)
+        parsed = values.str.rstrip('s')
+        return parsed, ~parsed.isin(VALID_DAYS).to_numpy(), "expected a day of the week"
+
+    return values, np.zeros(len(values), dtype=bool), ""
+
+
+def apply_schema(raw: pd.DataFrame, schema: List[ColumnSpec]) -> Tuple[pd.DataFrame, List[RowError]]:
+    """
+    Parse a frame read with dtype=str according to `schema`, each column once
+    with vectorized converters. Rows with any value that fails to parse are
+    dropped and reported as RowErrors instead of aborting the load. Missing
+    required columns raise ValueError. Columns outside the schema stay strings.
+    """
+    missing_columns = [spec.name for spec in schema if spec.required and spec.name not in raw.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    df = raw.copy()
+    errors: List[RowError] = []
+    bad_rows = np.zeros(len(df), dtype=bool)
+    for spec in schema:
+        if spec.name not in df.columns:
+            continue
+        parsed, bad, message = _convert(raw[spec.name], spec)
+        for position in np.flatnonzero(bad):
+            value = raw[spec.name].iloc[position]
+            errors.append(RowError(int(position) + 2, spec.name, '' if pd.isna(value) else str(value), message))
+        bad_rows |= bad
+
+        if spec.kind == 'time':
+            df[spec.name] = parsed.dt.strftime(TIME_FORMAT)
+            if spec.minutes_column:
+                df[spec.minutes_column] = (parsed.dt.hour * 60 + parsed.dt.minute).fillna(0).astype(np.int64)
+        else:
+            df[spec.name] = parsed
+
+    df = df[~bad_rows].reset_index(drop=True)
+
+    # Whole-number columns are int64 unless they have blanks
+    for spec in schema:
+        if spec.kind == 'int' and spec.name in df.columns and not df[spec.name].isna().any():
+            df[spec.name] = df[spec.name].astype(np.int64)
+
+    errors.sort(key=lambda error: (error.row, error.column))
+    return df, errors
@@ -0,0 +1,69 @@
+import json
+import os
+from typing import Optional
+
+import pandas as pd
+
+# pyarrow is optional: without it the processed frame is always rebuilt from the CSV
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# Bump when load_and_process_data changes the columns it derives, so older
+# snapshots are rebuilt instead of loaded
+SNAPSHOT_VERSION = 6
+METADATA_KEY = b'afterschool_snapshot'
+
+
+def snapshot_path_for(source_path: str) -> str:
+    """Snapshot file that sits next to a source CSV"""
+    return os.path.splitext(source_path)[0] + '.feather'
+
+
+def snapshots_available() -> bool:
+    return feather is not None
+
+
+def is_fresh(snapshot_path: str, source_path: str) -> bool:
+    """True if the snapshot exists and was written after the source last changed"""
+    try:
+        return os.stat(snapshot_path).st_mtime_ns > os.stat(source_path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def write_snapshot(df: pd.DataFrame, path: str):
+    """
+    Write a processed frame as an uncompressed Arrow IPC (Feather v2) file, so
+    it can be memory-mapped on load. df.attrs are stored as JSON in the schema
+    metadata. Written to a temp file and renamed, so readers never see a
+    partial snapshot.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to write data snapshots")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({'version': SNAPSHOT_VERSION, 'attrs': df.attrs}).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Optional[pd.DataFrame]:
+    """Memory-map a snapshot; None if it is missing, unreadable or from another SNAPSHOT_VERSION"""
+    try:
+        table = feather.read_table(path, memory_map=True)
+        info = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b'{}'))
+        if info.get('version') != SNAPSHOT_VERSION:
+            return None
+        df = table.to_pandas()
+    except Exception as e:
+        print(f"Error reading snapshot {path}: {str(e)}")
+        return None
+    df.attrs.update(info.get('attrs', {}))
+    return df
@@ -0,0 +1,62 @@
+from math import cos, floor, radians
+
+import numpy as np
+
+# Miles per degree of latitude (and of longitude at the equator), rounded down
+# so the search box is never smaller than the search circle
+MILES_PER_DEGREE = 69.0
+
+
+class SpatialIndex:
+    """
+    Grid index over point coordinates for radius queries.
+
+    Points are bucketed into square cells of `cell_degrees` (geohash-style
+    integer cell ids, row-major by latitude band) and kept sorted by cell id.
+    A radius query only visits the cells overlapping the circle's bounding
+    box: each latitude band is one contiguous run of ids, found with a binary
+    search. Returned candidates still need an exact distance check.
+    Points with NaN coordinates are not indexed.
+    """
+
+    def __init__(self, lats, lons, cell_degrees: float = 0.01):
+        self.cell_degrees = cell_degrees
+        self.n_cols = int(np.ceil(360.0 / cell_degrees)) + 1
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+        ids = self._cell_ids(lats[valid], lons[valid])
+        order = np.argsort(ids, kind='stable')
+
+        self._ids = ids[order]
+        self._positions = np.flatnonzero(valid)[order]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _cell_ids(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        rows = np.floor((lats + 90.0) / self.cell_degrees).astype(np.int64)
+        cols = np.floor((lons + 180.0) / self.cell_degrees).astype(np.int64)
+        return rows * self.n_cols + cols
+
+    def query_radius(self, lat: float, lon: float, miles: float) -> np.ndarray:
+        """Positions of the indexed points in cells that overlap the circle"""
+        dlat = miles / MILES_PER_DEGREE
+        # Longitude degrees shrink toward the poles; size the box for its widest latitude
+        widest = min(abs(lat) + dlat, 89.9)
+        dlon = miles / (MILES_PER_DEGREE * cos(radians(widest)))
+
+        row_lo = floor((lat - dlat + 90.0) / self.cell_degrees)
+        row_hi = floor((lat + dlat + 90.0) / self.cell_degrees)
+        col_lo = max(floor((lon - dlon + 180.0) / self.cell_degrees), 0)
+        col_hi = min(floor((lon + dlon + 180.0) / self.cell_degrees), self.n_cols - 1)
+
+        band_starts = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.n_cols
+        starts = np.searchsorted(self._ids, band_starts + col_lo, side='left')
+        ends = np.searchsorted(self._ids, band_starts + col_hi, side='right')
+
+        runs = [self._positions[s:e] for s, e in zip(starts, ends) if e > s]
+        if not runs:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(runs)
@@ -1,59 +1,138 @@
 import pandas as pd
+import numpy as np
 from datetime import datetime
-import requests
-import time
-import json
 import os
-from typing import Optional, Tuple, Dict
-from math import radians, sin, cos, sqrt, atan2
-
-# Cache file path
+import hashlib
+import weakref
+from typing import Optional, Tuple, Dict, List
+from geocode_store import GeocodeStore, APPROXIMATE, ERROR, NOT_FOUND
+from addresses import normalize_address
+from spatial_index import SpatialIndex
+from schema import PROGRAM_SCHEMA, TIME_FORMAT, RowError, apply_schema
+from snapshot import snapshot_path_for, snapshots_available, is_fresh, read_snapshot, write_snapshot
+from query_planner import Predicate, ResultCache, MaskCache, execute_plan, evaluate_masks
+from geocoder import PENDING, USER_PRIORITY, BACKGROUND_PRIORITY, TokenBucket, GeocodeWorker, GeocoderChain, GazetteerBackend, NominatimBackend, CircuitBreaker
+
+# Cache file paths - the JSON file seeds the SQLite store on first run
 CACHE_FILE = 'geocode_cache.json'
+CACHE_DB = 'geocode_cache.db'
 
-# Load cache from file if it exists
-def load_cache() -> Dict[str, Optional[Tuple[float, float]]]:
-    """Load geocode cache from JSON file"""
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r') as f:
-                data = json.load(f)
-                # Convert lists back to tuples (JSON doesn't support tuples)
-                return {k: tuple(v) if v else None for k, v in data.items()}
-        except Exception as e:
-            print(f"Error loading cache: {e}")
-            return {}
-    return {}
-
-def save_cache(cache: Dict[str, Optional[Tuple[float, float]]]):
-    """Save geocode cache to JSON file"""
-    try:
-        # Convert tuples to lists for JSON serialization
-        data = {k: list(v) if v else None for k, v in cache.items()}
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Error saving cache: {e}")
+# Load cache from the SQLite store, importing the JSON seed if present; the
+# JSON file is re-exported whenever the store compacts
+def load_cache() -> GeocodeStore:
+    """Open the persistent geocode store"""
+    return GeocodeStore(CACHE_DB, seed_path=CACHE_FILE, export_path=CACHE_FILE, key_func=normalize_address)
 
-# Cache for storing geocoded coordinates - load from file
-coordinate_cache: Dict[str, Optional[Tuple[float, float]]] = load_cache()
+# Cache for storing geocoded coordinates - backed by SQLite
+coordinate_cache: GeocodeStore = load_cache()
 print(f"Loaded {len(coordinate_cache)} addresses from cache")
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+def haversine_distances(lat: float, lon: float, lats, lons) -> np.ndarray:
     """
-    Calculate distance between two points using Haversine formula.
-    Returns distance in miles.
+    Vectorized Haversine distance from one point to arrays of points.
+    Returns distances in miles; NaN coordinates yield NaN distances.
     """
     R = 3959.87433  # Earth's radius in miles
 
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    lon2 = np.radians(np.asarray(lons, dtype=float))
     dlat = lat2 - lat1
     dlon = lon2 - lon1
 
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    distance = R * c
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+    return R * c
+
+def _lookup_coordinate_maps(addresses) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Non-blocking lookup of unique addresses; returns lat and lon maps of the resolved ones"""
+    coords = {address: geocode_address_async(address) for address in addresses}
+    resolved = {address: c for address, c in coords.items() if c}
+    return ({address: c[0] for address, c in resolved.items()},
+            {address: c[1] for address, c in resolved.items()})
 
-    return distance
+def add_coordinate_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add float 'lat'/'lon' columns to a program frame.
+    Each unique address is looked up once and the results are mapped back onto
+    every row that shares it. Unresolved addresses get NaN and are queued on
+    the background geocoder instead of blocking the load.
+    """
+    lat_map, lon_map = _lookup_coordinate_maps(df['Address'].dropna().unique())
+    df['lat'] = df['Address'].map(lat_map).astype(float)
+    df['lon'] = df['Address'].map(lon_map).astype(float)
+    return df
+
+# Refreshed frames per source frame, keyed by object identity:
+# (weak reference to the source, coordinate_cache.version, refreshed frame)
+_refreshed_frames: Dict[int, Tuple[weakref.ref, int, pd.DataFrame]] = {}
+
+def refresh_coordinates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Re-apply the geocode store's current coordinates to 'lat'/'lon': fills
+    addresses the background geocoder resolved since load and replaces ones
+    it re-resolved (e.g. a ZIP-centroid fallback later found exactly).
+    Returns the frame unchanged when nothing differs. The refreshed frame is
+    remembered per source frame and returned as the same object until the
+    geocode store changes, so fingerprints and spatial indexes built for it
+    are reused across reruns.
+    """
+    key = id(df)
+    version = coordinate_cache.version
+    cached = _refreshed_frames.get(key)
+    if cached is None or cached[0]() is not df:
+        cached = None
+    elif cached[1] == version:
+        return cached[2] if cached[2] is not None else df
+
+    # Start from the last refresh so an unchanged store yields the same object
+    base = cached[2] if cached is not None and cached[2] is not None else df
+    refreshed = _apply_current_coordinates(base)
+    # None stands for `df` itself, so the entry never keeps the source frame alive
+    _refreshed_frames[key] = (weakref.ref(df, lambda _, key=key: _refreshed_frames.pop(key, None)), version,
+                              None if refreshed is df else refreshed)
+    return refreshed
+
+def _apply_current_coordinates(df: pd.DataFrame) -> pd.DataFrame:
+    if 'lat' not in df.columns or 'lon' not in df.columns:
+        return add_coordinate_columns(df.copy())
+
+    lat_map, lon_map = _lookup_coordinate_maps(df['Address'].dropna().unique())
+    if not lat_map:
+        return df
+
+    # Addresses without a current result (pending, not found) keep their coordinates
+    lat = df['Address'].map(lat_map).astype(float).fillna(df['lat']).to_numpy(dtype=float)
+    lon = df['Address'].map(lon_map).astype(float).fillna(df['lon']).to_numpy(dtype=float)
+    old_lat = df['lat'].to_numpy(dtype=float)
+    old_lon = df['lon'].to_numpy(dtype=float)
+    unchanged = (((lat == old_lat) | (np.isnan(lat) & np.isnan(old_lat)))
+                 & ((lon == old_lon) | (np.isnan(lon) & np.isnan(old_lon))))
+    if unchanged.all():
+        return df
+
+    df = df.copy()
+    df['lat'] = lat
+    df['lon'] = lon
+    return df
+
+# Spatial indexes built per program frame, keyed by object identity
+_spatial_indexes: Dict[int, Tuple[weakref.ref, SpatialIndex]] = {}
+
+def get_spatial_index(df: pd.DataFrame) -> SpatialIndex:
+    """
+    Grid index over a frame's 'lat'/'lon' columns, built once per frame object
+    and dropped when the frame is garbage collected.
+    """
+    key = id(df)
+    cached = _spatial_indexes.get(key)
+    if cached is not None and cached[0]() is df:
+        return cached[1]
+
+    index = SpatialIndex(df['lat'].to_numpy(dtype=float), df['lon'].to_numpy(dtype=float))
+    _spatial_indexes[key] = (weakref.ref(df, lambda _, key=key: _spatial_indexes.pop(key, None)), index)
+    return index
 
 def parse_time(time_str: str) -> datetime.time:
     """Convert time string to datetime.time object"""
@@ -62,248 +141,660 @@ def parse_time(time_str: str) -> datetime.time:
     except ValueError:
         return datetime.strptime(time_str, '%H:%M').time()
 
-def is_time_in_range(start_time: str, end_time: str, range_start: str, range_end: str) -> bool:
-    """Check if program time falls within specified range"""
-    prog_start = parse_time(start_time)
-    prog_end = parse_time(end_time)
-    filter_start = parse_time(range_start)
-    filter_end = parse_time(range_end)
+def time_to_minutes(time_str: str) -> int:
+    """Convert a time string ('03:00 PM' or '15:00') to minutes from midnight"""
+    t = parse_time(time_str)
+    return t.hour * 60 + t.minute
+
+# Integer minute columns derived from the normalized time strings
+TIME_MINUTE_COLUMNS = {spec.name: spec.minutes_column for spec in PROGRAM_SCHEMA if spec.minutes_column}
+
+def add_time_minute_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Add integer 'start_min'/'end_min' columns parsed from the '%I:%M %p' time strings"""
+    for col, minute_col in TIME_MINUTE_COLUMNS.items():
+        parsed = pd.to_datetime(df[col], format=TIME_FORMAT)
+        df[minute_col] = (parsed.dt.hour * 60 + parsed.dt.minute).astype(int)
+    return df
+
+# How long negative results are trusted before the background sweep
+# re-resolves them: "not found" is stable, errors are usually transient.
+# Fallback coordinates stored during an outage are retried like errors.
+NEGATIVE_TTLS = {
+    NOT_FOUND: 7 * 24 * 3600,
+    ERROR: 15 * 60,
+    APPROXIMATE: 15 * 60,
+}
+
+# How often the idle geocode worker checks for expired negatives
+SWEEP_INTERVAL = 300.0
+
+def resolve_address(address: str) -> Optional[Tuple[float, float]]:
+    """
+    Convert address to coordinates using the geocoder chain and store the
+    typed result in the cache. Runs on the background geocode worker.
+    Fresh entries are returned as-is; expired negatives are looked up again.
+    The worker queues each normalized address once, so equivalent addresses
+    requested at the same time share a single lookup.
+    """
+    entry = coordinate_cache.entry(address)
+    if entry is not None and not entry.is_expired(NEGATIVE_TTLS):
+        return entry.coords
+
+    coords, status = geocoder.lookup(address)
+    coordinate_cache.put(address, coords, status=status)
+    return coords
 
-    return prog_start >= filter_start and prog_end <= filter_end
+def sweep_expired_negatives():
+    """Queue every expired not-found/error/approximate entry for re-resolution"""
+    for entry in coordinate_cache.expired_entries(NEGATIVE_TTLS):
+        geocode_worker.submit(entry.query)
 
-def geocode_address(address: str) -> Optional[Tuple[float, float]]:
+# Bundled offline address / ZIP-centroid table
+GAZETTEER_FILE = 'attached_assets/gazetteer.csv'
+
+# Set GEOCODER_OFFLINE=1 on hosts without outbound network
+GEOCODER_OFFLINE = os.environ.get('GEOCODER_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+def build_geocoder(offline: bool = GEOCODER_OFFLINE) -> GeocoderChain:
+    """
+    Resolver chain: exact gazetteer match, then Nominatim, then the ZIP
+    centroid of the address. ZIP centroids come last so they never replace
+    a precise remote result; offline they answer right away.
     """
-    Convert address to coordinates using OpenStreetMap's Nominatim API.
-    Includes caching and rate limiting.
-    Tries simplified address if full address fails (removes floor/suite info).
+    backends = [GazetteerBackend(GAZETTEER_FILE)]
+    if not offline:
+        backends.append(NominatimBackend(rate_limiter, breaker=remote_breaker))
+    backends.append(GazetteerBackend(GAZETTEER_FILE, use_zip_centroids=True))
+    return GeocoderChain(backends)
+
+# Process-wide rate limiter (1 request/second), remote circuit breaker,
+# resolver chain and background geocoder
+rate_limiter = TokenBucket(rate=1.0, capacity=1.0)
+remote_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0)
+geocoder = build_geocoder()
+geocode_worker = GeocodeWorker(resolve_address, idle_callback=sweep_expired_negatives,
+                               idle_interval=SWEEP_INTERVAL, key_func=normalize_address)
+geocode_worker.start()
+
+# How long a search waits for the user's own address before giving up
+USER_ADDRESS_TIMEOUT = 5.0
+
+def geocode_address_async(address: str, priority: int = BACKGROUND_PRIORITY):
+    """
+    Non-blocking lookup. Returns cached coordinates (or None for a known
+    failure) immediately; otherwise queues the address on the background
+    worker at `priority` and returns PENDING. Expired negatives are still
+    served from the cache here - the background sweep refreshes them.
     """
     if address in coordinate_cache:
         return coordinate_cache[address]
 
-    try:
-        # Rate limiting - be nice to the API
-        time.sleep(1)
-
-        # Create a properly formatted search URL
-        search_url = "https://nominatim.openstreetmap.org/search"
-        headers = {'User-Agent': 'AfterSchoolProgramFinder/1.0'}
-
-        # Try full address first
-        params = {
-            'q': address,
-            'format': 'json',
-            'limit': 1
-        }
-
-        response = requests.get(search_url, headers=headers, params=params)
-        response.raise_for_status()
-
-        results = response.json()
-        if results:
-            lat = float(results[0]['lat'])
-            lon = float(results[0]['lon'])
-            coordinate_cache[address] = (lat, lon)
-            save_cache(coordinate_cache)  # Save to file
-            return (lat, lon)
-
-        # If full address fails, try simplified version (remove floor/suite/apt info)
-        import re
-        # Remove patterns like "Floor 1A", "Suite 200", "Apt 3B", "Unit 5", etc.
-        simplified = re.sub(r'\s+(Floor|Suite|Apt|Apartment|Unit|#)\s+\w+\s*', ' ', address, flags=re.IGNORECASE)
-        simplified = simplified.strip()
-
-        if simplified != address:
-            # Try simplified address
-            time.sleep(1)  # Rate limit again
-            params['q'] = simplified
-            response = requests.get(search_url, headers=headers, params=params)
-            response.raise_for_status()
-            results = response.json()
-
-            if results:
-                lat = float(results[0]['lat'])
-                lon = float(results[0]['lon'])
-                # Cache both the original and simplified address with same coordinates
-                coordinate_cache[address] = (lat, lon)
-                coordinate_cache[simplified] = (lat, lon)
-                save_cache(coordinate_cache)  # Save to file
-                return (lat, lon)
-
-        coordinate_cache[address] = None
-        save_cache(coordinate_cache)  # Save to file
-        return None
+    # Local resolvers are cheap enough to answer inline
+    coords, status = geocoder.lookup(address, remote=False)
+    if coords:
+        coordinate_cache.put(address, coords, status=status)
+        return coords
 
-    except Exception as e:
-        print(f"Error geocoding address {address}: {str(e)}")
-        coordinate_cache[address] = None
-        save_cache(coordinate_cache)  # Save to file
-        return None
+    geocode_worker.submit(address, priority)
+    return PENDING
+
+def geocode_address(address: str, timeout: float = USER_ADDRESS_TIMEOUT) -> Optional[Tuple[float, float]]:
+    """
+    Convert a user's address to coordinates, waiting up to `timeout` seconds
+    for the background worker, which resolves it ahead of queued program
+    addresses. Returns None if the address is unknown or still pending.
+    """
+    coords = geocode_address_async(address, USER_PRIORITY)
+    if coords is PENDING:
+        geocode_worker.submit(address, USER_PRIORITY).wait(timeout)
+        coords = coordinate_cache.get(address)
+    return coords
+
+def is_address_pending(address: str) -> bool:
+    """True while an address is still queued on the background geocoder"""
+    return geocode_worker.is_pending(address)
+
+def pending_geocode_count() -> int:
+    """Number of addresses still waiting on the background geocoder"""
+    return geocode_worker.pending_count()
+
+def get_geocoder_stats() -> Dict[str, object]:
+    """Geocoder health for instrumentation: breaker state, failures, queue and cache size"""
+    stats = remote_breaker.stats()
+    stats['pending'] = geocode_worker.pending_count()
+    stats['cached_addresses'] = len(coordinate_cache)
+    return stats
+
+# Categories per int64 word column (the sign bit is left unused)
+CATEGORY_WORD_BITS = 63
+
+def category_word_columns(vocabulary: list) -> List[str]:
+    """
+    Integer columns holding the category bits: 'category_bits' for the first
+    CATEGORY_WORD_BITS categories, then 'category_bits_1', 'category_bits_2', ...
+    """
+    n_words = max(1, -(-len(vocabulary) // CATEGORY_WORD_BITS))
+    return ['category_bits' if word == 0 else f'category_bits_{word}' for word in range(n_words)]
 
-def filter_programs(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+def add_category_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Split the comma-separated 'Interest Category' values once and encode them.
+    The normalized vocabulary (display names, sorted, matched case-insensitively)
+    is stored in df.attrs['category_vocabulary']; category i is bit
+    i % CATEGORY_WORD_BITS of word column i // CATEGORY_WORD_BITS (see
+    category_word_columns), so any number of categories can be encoded.
+    """
+    exploded = df['Interest Category'].dropna().astype(str).str.split(',').explode().str.strip()
+    exploded = exploded[exploded != '']
+
+    # First spelling seen becomes the display name for each case-insensitive category
+    display_names = exploded.groupby(exploded.str.lower(), sort=False).first()
+    vocabulary = sorted(display_names.tolist())
+
+    index_by_name = {name.lower(): i for i, name in enumerate(vocabulary)}
+    positions = exploded.str.lower().map(index_by_name).to_numpy(dtype=np.int64)
+    # Each category is a distinct power of two within its word, so summing unique (row, word, bit) triples ORs them
+    triples = pd.DataFrame({
+        'row': exploded.index,
+        'word': positions // CATEGORY_WORD_BITS,
+        'bit': np.left_shift(np.int64(1), positions % CATEGORY_WORD_BITS)
+    }).drop_duplicates()
+
+    for word, column in enumerate(category_word_columns(vocabulary)):
+        row_bits = triples.loc[triples['word'] == word].groupby('row')['bit'].sum()
+        df[column] = row_bits.reindex(df.index, fill_value=0).astype(np.int64)
+    df.attrs['category_vocabulary'] = vocabulary
+    return df
+
+def category_bitmask(vocabulary: list, categories: list) -> np.ndarray:
+    """
+    One int64 mask per category word column for a list of category names;
+    names outside the vocabulary match nothing
     """
-    Filter programs based on multiple criteria
+    index_by_name = {name.lower(): i for i, name in enumerate(vocabulary)}
+    masks = np.zeros(len(category_word_columns(vocabulary)), dtype=np.int64)
+    for category in categories:
+        i = index_by_name.get(str(category).strip().lower())
+        if i is not None:
+            masks[i // CATEGORY_WORD_BITS] |= np.int64(1) << (i % CATEGORY_WORD_BITS)
+    return masks
+
+# Grade levels in order; bit i of 'grade_bits' is GRADE_LEVELS[i]
+GRADE_LEVELS = ['3K', 'UPK', 'K', '1st', '2nd', '3rd', '4th', '5th', '6th',
+                '7th', '8th', '9th', '10th', '11th', '12th']
+GRADE_ALIASES = {'pk': 'UPK', 'pre-k': 'UPK', 'prek': 'UPK', 'kindergarten': 'K'}
+GRADE_ALIASES.update({str(i): grade for i, grade in enumerate(GRADE_LEVELS[3:], start=1)})
+_GRADE_BITS = {grade.lower(): 1 << i for i, grade in enumerate(GRADE_LEVELS)}
+_GRADE_BITS.update({alias: _GRADE_BITS[grade.lower()] for alias, grade in GRADE_ALIASES.items()})
+
+def grade_bitmask(grades) -> int:
+    """Bitmask for one grade or a list of grades (e.g. siblings in 3K and K); unknown grades are ignored"""
+    if isinstance(grades, str):
+        grades = [grades]
+    mask = 0
+    for grade in grades:
+        mask |= _GRADE_BITS.get(str(grade).strip().lower(), 0)
+    return mask
+
+def add_grade_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
-    filtered_df = df.copy()
+    Parse the '|'-separated Grade_Level values once into an integer 'grade_bits'
+    column and a 'grade_unrestricted' flag for rows without grade limits.
+    """
+    levels = df['Grade_Level'].astype('string').str.strip()
+    df['grade_unrestricted'] = (levels.isna() | (levels == '')).to_numpy(dtype=bool)
+
+    exploded = levels.str.split('|').explode().str.strip().str.lower().dropna()
+    bits = pd.Series(exploded.map(_GRADE_BITS).fillna(0).to_numpy(dtype=np.int32), index=exploded.index)
+    pairs = pd.DataFrame({'row': bits.index, 'bit': bits.to_numpy()}).drop_duplicates()
+    row_bits = pairs.groupby('row')['bit'].sum()
+
+    df['grade_bits'] = row_bits.reindex(df.index, fill_value=0).astype(np.int32)
+    return df
 
-    # Days filter
+class DayPredicate(Predicate):
+    name = 'days'
+    cost = 2.0
+
+    def __init__(self, days: list):
+        super().__init__(tuple(sorted(days)))
+        self.selectivity = min(len(self.params) / 7.0, 1.0)
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return df['Day of the week'].isin(self.params).to_numpy(dtype=bool)
+
+class AgePredicate(Predicate):
+    name = 'age'
+
+    def __init__(self, child_age):
+        super().__init__((child_age,))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        # Round down min ages (e.g., 3.5 becomes 3) to be more inclusive for parents
+        child_age = self.params[0]
+        return ((np.floor(df['Min Age']) <= child_age) & (df['Max Age'] >= child_age)).to_numpy(dtype=bool)
+
+class TimePredicate(Predicate):
+    name = 'time'
+
+    def __init__(self, start_time: str, end_time: str):
+        super().__init__((time_to_minutes(start_time), time_to_minutes(end_time)))
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        if 'start_min' not in df.columns or 'end_min' not in df.columns:
+            df = add_time_minute_columns(df.copy())
+        return df
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        range_start, range_end = self.params
+        return ((df['start_min'].to_numpy() >= range_start) & (df['end_min'].to_numpy() <= range_end))
+
+class CategoryPredicate(Predicate):
+    name = 'categories'
+
+    def __init__(self, categories: list):
+        super().__init__(tuple(sorted(str(c).strip().lower() for c in categories)))
+        self.selectivity = max(1.0 - 0.15 * len(self.params), 0.1)
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        if 'category_bits' not in df.columns or 'category_vocabulary' not in df.attrs:
+            df = add_category_columns(df.copy())
+        return df
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        vocabulary = df.attrs['category_vocabulary']
+        matched = np.zeros(len(df), dtype=bool)
+        for column, selected_mask in zip(category_word_columns(vocabulary), category_bitmask(vocabulary, self.params)):
+            if selected_mask:
+                matched |= (df[column].to_numpy() & selected_mask) != 0
+        return matched
+
+class ProgramTypePredicate(Predicate):
+    name = 'program_type'
+    cost = 2.0
+
+    def __init__(self, program_type: str):
+        super().__init__((program_type,))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return df['Program Type'].isin(self.params).to_numpy(dtype=bool)
+
+class GradePredicate(Predicate):
+    name = 'grade'
+    # Off-site programs have no grade limits and always pass
+    selectivity = 0.8
+
+    def __init__(self, grades):
+        if isinstance(grades, str):
+            grades = [grades]
+        super().__init__(tuple(sorted(str(g).strip() for g in grades)))
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        if 'grade_bits' not in df.columns:
+            df = add_grade_columns(df.copy())
+        return df
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        selected_bits = grade_bitmask(self.params)
+        return df['grade_unrestricted'].to_numpy() | ((df['grade_bits'].to_numpy() & selected_bits) != 0)
+
+class AvailabilityPredicate(Predicate):
+    name = 'availability'
+    # Most programs have spots open
+    selectivity = 0.8
+
+    def __init__(self, levels: list):
+        super().__init__(tuple(level for level in AVAILABILITY_LEVELS if level in levels))
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        if 'availability' not in df.columns:
+            df = add_availability_column(df.copy())
+        return df
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return df['availability'].isin(self.params).to_numpy(dtype=bool)
+
+class DistancePredicate(Predicate):
+    """
+    Programs within `max_distance` miles of already-geocoded user coordinates.
+    The spatial index narrows the search to programs in grid cells near the
+    user; exact distances are computed only for those. Adds the 'Distance'
+    column to the result and sorts by it.
+    """
+    name = 'distance'
+    cost = 25.0
+    selectivity = 0.3
+
+    def __init__(self, user_coords: Tuple[float, float], max_distance: float):
+        super().__init__((float(user_coords[0]), float(user_coords[1]), float(max_distance)))
+        self.distances: Optional[np.ndarray] = None
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Pick up addresses the background geocoder resolved since load;
+        # programs still waiting on it have no coordinates and are skipped
+        return refresh_coordinates(df)
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        lat, lon, max_distance = self.params
+        candidates = get_spatial_index(df).query_radius(lat, lon, max_distance)
+        self.distances = np.full(len(df), np.nan)
+        self.distances[candidates] = haversine_distances(
+            lat, lon,
+            df['lat'].to_numpy(dtype=float)[candidates], df['lon'].to_numpy(dtype=float)[candidates]
+        )
+        return self.distances <= max_distance
+
+    def finalize(self, result: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+        result['Distance'] = self.distances[positions] if self.distances is not None else np.nan
+        return result.sort_values('Distance')  # Sort by distance
+
+def plan_filters(df: pd.DataFrame, filters: dict, notices: Optional[List[str]] = None,
+                 address_timeout: float = USER_ADDRESS_TIMEOUT) -> list:
+    """
+    Turn the search form's filters dict into the predicates that apply to `df`.
+    The user's address is waited on for at most `address_timeout` seconds.
+    A requested filter that cannot be applied (the user's address is still
+    being located or was not found) is left out and, when `notices` is a list,
+    explained there for the parent.
+    """
+    predicates = []
     if filters.get('selected_days'):
-        filtered_df = filtered_df[filtered_df['Day of the week'].isin(filters['selected_days'])]
+        predicates.append(DayPredicate(filters['selected_days']))
 
     # Child age filter - show programs where child's age falls within the program's age range
-    # Round down min ages (e.g., 3.5 becomes 3) to be more inclusive for parents
     if filters.get('child_age') is not None:
-        child_age = filters['child_age']
-        import numpy as np
-        filtered_df = filtered_df[
-            (np.floor(filtered_df['Min Age']) <= child_age) &
-            (filtered_df['Max Age'] >= child_age)
-        ]
-
-    # Time range filter
+        predicates.append(AgePredicate(filters['child_age']))
+
     if filters.get('start_time') and filters.get('end_time'):
-        filtered_df = filtered_df[
-            filtered_df.apply(
-                lambda row: is_time_in_range(
-                    row['Start time'],
-                    row['End time'],
-                    filters['start_time'],
-                    filters['end_time']
-                ),
-                axis=1
-            )
-        ]
-
-    # Interest categories filter - support comma-separated categories
+        predicates.append(TimePredicate(filters['start_time'], filters['end_time']))
+
     if filters.get('selected_interests'):
-        selected_categories = filters['selected_interests']
-
-        # Create a mask for programs that match any selected category
-        def matches_category(cat_value):
-            if pd.isna(cat_value):
-                return False
-
-            # Split the stored category into individual categories
-            stored_categories = [c.strip().lower() for c in str(cat_value).split(',')]
-
-            # Check if any selected category matches any stored category
-            for selected_cat in selected_categories:
-                if selected_cat.strip().lower() in stored_categories:
-                    return True
-            return False
-
-        category_mask = filtered_df['Interest Category'].apply(matches_category)
-        filtered_df = filtered_df[category_mask]
-
-    # Program Type filter (On-site/Off-site)
-    if filters.get('program_types'):
-        program_types = filters['program_types']
-        # Only filter if at least one type is selected and not both
-        if len(program_types) > 0 and len(program_types) < 2:
-            if 'Program Type' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['Program Type'].isin(program_types)]
-
-    # Grade level filter for on-site programs
-    if filters.get('grade_level'):
-        selected_grade = filters['grade_level']
-
-        # Filter by grade level - only for on-site programs with Grade_Level data
-        if 'Grade_Level' in filtered_df.columns:
-            def matches_grade(row):
-                # If program has no grade level (off-site programs), include based on age only
-                if pd.isna(row.get('Grade_Level')) or not str(row.get('Grade_Level')).strip():
-                    return True
-
-                # For on-site programs with grade levels, check if selected grade is in the list
-                grade_levels = str(row['Grade_Level']).split('|')
-                grade_levels_clean = [g.strip() for g in grade_levels]
-                return selected_grade in grade_levels_clean
-
-            filtered_df = filtered_df[filtered_df.apply(matches_grade, axis=1)]
-
-    # Distance filter
+        predicates.append(CategoryPredicate(filters['selected_interests']))
+
+    # Program Type filter (On-site/Off-site) - only if exactly one type is selected
+    program_types = filters.get('program_types') or []
+    if len(program_types) == 1 and 'Program Type' in df.columns:
+        predicates.append(ProgramTypePredicate(program_types[0]))
+
+    # Grade level filter - only on-site programs with Grade_Level data are restricted
+    if filters.get('grade_level') and 'Grade_Level' in df.columns:
+        predicates.append(GradePredicate(filters['grade_level']))
+
+    # Availability levels to include (e.g. ['Spots Open', 'Waitlist'])
+    if filters.get('availability'):
+        predicates.append(AvailabilityPredicate(filters['availability']))
+
     if filters.get('user_address') and filters.get('max_distance'):
-        user_coords = geocode_address(filters['user_address'])
+        user_coords = geocode_address(filters['user_address'], timeout=address_timeout)
         if user_coords:
-            # Calculate distances for all programs
-            distances = []
-            for _, program in filtered_df.iterrows():
-                prog_coords = geocode_address(program['Address'])
-                if prog_coords:
-                    distance = calculate_distance(
-                        user_coords[0], user_coords[1],
-                        prog_coords[0], prog_coords[1]
-                    )
-                    distances.append(distance)
-                else:
-                    distances.append(float('inf'))
-
-            # Add distances to dataframe and filter
-            filtered_df['Distance'] = distances
-            filtered_df = filtered_df[filtered_df['Distance'] <= filters['max_distance']]
-            filtered_df = filtered_df.sort_values('Distance')  # Sort by distance
-
-    return filtered_df
-
-def load_and_process_data(file_path):
-    """Load and process the CSV data with enhanced validation."""
+            predicates.append(DistancePredicate(user_coords, filters['max_distance']))
+        elif notices is not None:
+            if is_address_pending(filters['user_address']):
+                notices.append("Distance filter not applied: still locating your address. Search again in a moment.")
+            else:
+                notices.append("Distance filter not applied: we couldn't find your address. Please check it and search again.")
+
+    return predicates
+
+# Filter results shared by every session in this process (row positions, not frames)
+RESULT_CACHE_BYTES = 16 * 1024 * 1024
+result_cache = ResultCache(max_bytes=RESULT_CACHE_BYTES)
+
+def filter_programs(df: pd.DataFrame, filters: dict, explain: Optional[list] = None,
+                    masks: Optional[MaskCache] = None, notices: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Filter programs based on multiple criteria.
+    Filters are planned into predicates (cheapest and most selective first),
+    evaluated as masks over `df` and materialized once; repeated queries are
+    served from the process-wide result cache. Pass a session's MaskCache as
+    `masks` so a re-query only evaluates the predicates that changed, a
+    list as `explain` to collect per-step timings and row counts, and a list
+    as `notices` to collect messages about filters that could not be applied.
+    """
+    return execute_plan(df, plan_filters(df, filters, notices), explain=explain, cache=result_cache, masks=masks)
+
+def get_result_cache_stats() -> Dict[str, object]:
+    """Result cache hit/miss counters and size, for sizing RESULT_CACHE_BYTES"""
+    return result_cache.stats()
+
+# Columns that identify one program session; their hash is the row's 'program_id'
+PROGRAM_KEY_COLUMNS = ['Program Name', 'Provider Name', 'Day of the week', 'Start time']
+
+def _program_key_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # Plain strings whatever the column dtype, so categorical and string frames hash the same
+    return pd.DataFrame({col: df[col].astype(object).fillna('').astype(str) for col in PROGRAM_KEY_COLUMNS})
+
+def add_program_id_column(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add a stable 64-bit 'program_id' hashed from PROGRAM_KEY_COLUMNS.
+    pandas hashes with a fixed key, so ids are the same in every process and
+    run, and saved schedules can be matched against the data by integer.
+    """
+    hashes = pd.util.hash_pandas_object(_program_key_frame(df), index=False).to_numpy()
+    df['program_id'] = hashes.view(np.int64)
+    return df
+
+def get_program_id(program) -> int:
+    """program_id of one program row or saved program dict (hashed if it has none yet)"""
+    program_id = program.get('program_id')
+    if program_id is not None and not pd.isna(program_id):
+        return int(program_id)
+    values = {col: ['' if pd.isna(program.get(col)) else program.get(col)] for col in PROGRAM_KEY_COLUMNS}
+    return int(add_program_id_column(pd.DataFrame(values))['program_id'].iloc[0])
+
+def build_saved_program_index(saved_schedules: Dict[str, list]) -> Dict[int, set]:
+    """Map of program_id -> set of schedule names holding it, for O(1) saved checks"""
+    index = {}
+    for name, programs in saved_schedules.items():
+        for prog in programs:
+            index.setdefault(get_program_id(prog), set()).add(name)
+    return index
+
+def saved_schedules_signature(saved_schedules: Dict[str, list]) -> tuple:
+    """Identity and length of each saved schedule list, to notice when an index built from them is stale"""
+    return (id(saved_schedules), tuple((name, id(programs), len(programs)) for name, programs in saved_schedules.items()))
+
+def join_saved_schedules(df: pd.DataFrame, saved_schedules: Dict[str, list]) -> pd.DataFrame:
+    """
+    Rows of `df` saved in any schedule, with a 'Schedule_Name' column. Hash join
+    on program_id against a small (program, schedule) frame; a program saved
+    in several schedules appears once, labelled with every schedule name.
+    """
+    saved = pd.DataFrame(
+        [(get_program_id(prog), name) for name, programs in saved_schedules.items() for prog in programs],
+        columns=['program_id', 'Schedule_Name']
+    ).drop_duplicates()
+    schedule_names = saved.groupby('program_id', sort=False)['Schedule_Name'].agg(', '.join)
+    result = df.loc[df['program_id'].isin(schedule_names.index)].copy()
+    result['Schedule_Name'] = result['program_id'].map(schedule_names)
+    return result
+
+def compute_facets(df: pd.DataFrame, filters: dict, masks: Optional[MaskCache] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Result counts per option of each multi-valued filter, keyed like the
+    filters dict ('selected_interests', 'selected_days', 'program_types',
+    'availability', 'grade_level'). Each option's count is the number of programs matching
+    every other current filter plus that option, so it is what selecting the
+    option would add. Every predicate mask is evaluated once (or taken from
+    `masks`) and counts come from the category/grade bit columns in one pass.
+    """
+    # Facets are computed on every rerun, so they never wait on the geocoder:
+    # while the user's address is pending, counts leave distance out
+    df, evaluated = evaluate_masks(df, plan_filters(df, filters, address_timeout=0), masks)
+    if 'category_bits' not in df.columns or 'category_vocabulary' not in df.attrs:
+        df = add_category_columns(df.copy())
+    if 'Grade_Level' in df.columns and 'grade_bits' not in df.columns:
+        df = add_grade_columns(df.copy())
+
+    def rows_matching_others(name: str) -> np.ndarray:
+        keep = np.ones(len(df), dtype=bool)
+        for predicate, matched in evaluated:
+            if predicate.name != name:
+                keep &= matched
+        return keep
+
+    facets = {}
+
+    rows = rows_matching_others('categories')
+    vocabulary = df.attrs['category_vocabulary']
+    counts = []
+    for word, column in enumerate(category_word_columns(vocabulary)):
+        bits = df[column].to_numpy()[rows]
+        n_bits = min(CATEGORY_WORD_BITS, len(vocabulary) - word * CATEGORY_WORD_BITS)
+        counts.extend(((bits[:, None] >> np.arange(n_bits, dtype=np.int64)) & 1).sum(axis=0).tolist())
+    facets['selected_interests'] = dict(zip(vocabulary, counts))
+
+    rows = rows_matching_others('days')
+    facets['selected_days'] = {day: int(n) for day, n in df.loc[rows, 'Day of the week'].value_counts().items() if n}
+
+    if 'Program Type' in df.columns:
+        rows = rows_matching_others('program_type')
+        facets['program_types'] = {t: int(n) for t, n in df.loc[rows, 'Program Type'].value_counts().items() if n}
+
+    if 'availability' in df.columns:
+        rows = rows_matching_others('availability')
+        facets['availability'] = {level: int(n) for level, n in df.loc[rows, 'availability'].value_counts().items() if n}
+
+    if 'grade_bits' in df.columns:
+        rows = rows_matching_others('grade')
+        grade_bits = df['grade_bits'].to_numpy()[rows]
+        unrestricted = df['grade_unrestricted'].to_numpy()[rows]
+        has_grade = (grade_bits[:, None] >> np.arange(len(GRADE_LEVELS))) & 1
+        counts = (has_grade.astype(bool) | unrestricted[:, None]).sum(axis=0)
+        facets['grade_level'] = dict(zip(GRADE_LEVELS, counts.tolist()))
+
+    return facets
+
+# Content hashes per file, reused while the file's size and mtime are unchanged
+_file_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+def file_content_hash(path: str) -> str:
+    """Hash of a file's bytes; the file is only re-read when its size or mtime changes"""
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    _file_hashes[path] = (signature, digest.hexdigest())
+    return _file_hashes[path][1]
+
+# String columns with at most this many distinct values per row become categoricals
+CATEGORY_MAX_RATIO = 0.5
+# Derived encodings keep their dtypes: bit tests, ids and distances depend on them
+# (every 'category_bits*' word column is kept as well)
+COMPACT_EXCLUDE = {'category_bits', 'grade_bits', 'program_id', 'lat', 'lon'}
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrink a program frame in place: repeated strings (provider, day, address,
+    descriptions, ...) become categoricals so each distinct value is stored
+    once, integers become int32 and floats become float32 when that is lossless.
+    """
+    for col in df.columns:
+        if col in COMPACT_EXCLUDE or col.startswith('category_bits'):
+            continue
+        values = df[col]
+        if pd.api.types.is_string_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            if values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+                df[col] = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values) and values.dtype.itemsize > 4:
+            if len(values) == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max):
+                df[col] = values.astype(np.int32)
+        elif pd.api.types.is_float_dtype(values) and values.dtype.itemsize > 4:
+            narrowed = values.astype(np.float32)
+            if ((narrowed.astype(np.float64) == values) | values.isna()).all():
+                df[col] = narrowed
+    return df
+
+def load_and_process_data(file_path, errors: Optional[List[RowError]] = None):
+    """
+    Load and process the CSV data with enhanced validation.
+    Columns are parsed once according to PROGRAM_SCHEMA. Rows with values
+    that fail to parse are skipped and logged; pass a list as `errors` to
+    collect them as RowErrors.
+    """
     try:
-        df = pd.read_csv(file_path)
-
-        # Validate required columns
-        required_columns = [
-            'Provider Name', 'Program Name', 'Day of the week',
-            'Start time', 'End time', 'Interest Category'
-        ]
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
-
-        # Convert date columns to datetime (allow both MM/DD/YYYY and M/D/YYYY)
-        date_columns = ['Start date', 'End date']
-        for col in date_columns:
-            if col in df.columns:
-                try:
-                    df[col] = pd.to_datetime(df[col], format='%m/%d/%Y')
-                except ValueError:
-                    try:
-                        df[col] = pd.to_datetime(df[col], format='%m/%d/%y')
-                    except ValueError:
-                        try:
-                            df[col] = pd.to_datetime(df[col], infer_datetime_format=True)
-                        except Exception:
-                            raise ValueError(f"Error in {col}: Dates must be in MM/DD/YYYY or similar format")
-
-        # Convert time columns to proper format
-        time_columns = ['Start time', 'End time']
-        for col in time_columns:
-            if col in df.columns:
-                try:
-                    df[col] = pd.to_datetime(df[col]).dt.strftime('%I:%M %p')
-                except ValueError as e:
-                    raise ValueError(f"Error in {col}: Times must be in HH:MM AM/PM format")
-
-        # Convert cost columns to numeric, removing '$' and ',' characters
-        if 'Cost' in df.columns:
-            df['Cost'] = df['Cost'].replace('[\$,]', '', regex=True).astype(float)
-        if 'Cost Per Class' in df.columns:
-            df['Cost Per Class'] = df['Cost Per Class'].replace('[\$,]', '', regex=True).astype(float)
-
-        # Normalize day names (remove 's' from plural days)
-        df['Day of the week'] = df['Day of the week'].str.rstrip('s')
-
-        # Validate days of week
-        valid_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        invalid_days = df[~df['Day of the week'].isin(valid_days)]['Day of the week'].unique()
-        if len(invalid_days) > 0:
-            raise ValueError(f"Invalid days found: {', '.join(invalid_days)}")
+        raw = pd.read_csv(file_path, dtype=str)
+        df, row_errors = apply_schema(raw, PROGRAM_SCHEMA)
+        for error in row_errors:
+            print(f"Skipping row {error.row} of {file_path}: {error.column} {error.value!r} - {error.message}")
+        if errors is not None:
+            errors.extend(row_errors)
+
+        # Category vocabulary and per-row bitmask for the interest filter
+        df = add_category_columns(df)
+
+        # Grade bitmask for the on-site grade filter
+        if 'Grade_Level' in df.columns:
+            df = add_grade_columns(df)
+
+        # Stable integer identity for saved schedules and membership checks
+        df = add_program_id_column(df)
+
+        # Availability level for the availability filter
+        df = add_availability_column(df)
+
+        # Compact dtypes; every worker process holds one of these frames
+        memory_before = df.memory_usage(deep=True).sum()
+        df = compact_frame(df)
+        memory_after = df.memory_usage(deep=True).sum()
+        print(f"Program data memory: {memory_before / 1024:.0f} KiB -> {memory_after / 1024:.0f} KiB")
+
+        # Resolve program coordinates once so filtering and the map only read
+        # columns, and index them for radius queries
+        if 'Address' in df.columns:
+            df = add_coordinate_columns(df)
+            get_spatial_index(df)
 
         return df
     except Exception as e:
         raise Exception(f"Error processing CSV file: {str(e)}")
 
+def compile_data(file_path: str) -> str:
+    """Parse the CSV and write its processed binary snapshot; returns the snapshot path"""
+    snapshot_path = snapshot_path_for(file_path)
+    write_snapshot(load_and_process_data(file_path), snapshot_path)
+    return snapshot_path
+
+def load_compiled_data(file_path: str, errors: Optional[List[RowError]] = None) -> pd.DataFrame:
+    """
+    Processed program data, memory-mapped from the binary snapshot next to the
+    CSV when the snapshot is newer than it. Otherwise the CSV is parsed and the
+    snapshot rewritten for the next cold start. Without pyarrow this is just
+    load_and_process_data. Row errors (see load_and_process_data) are only
+    reported when the CSV is parsed, not when the snapshot is used.
+    """
+    snapshot_path = snapshot_path_for(file_path)
+    if snapshots_available() and is_fresh(snapshot_path, file_path):
+        df = read_snapshot(snapshot_path)
+        if df is not None:
+            # Re-apply current coordinates: addresses geocoded or re-resolved
+            # since the snapshot was compiled
+            if 'Address' in df.columns:
+                df = refresh_coordinates(df)
+                get_spatial_index(df)
+            return df
+
+    df = load_and_process_data(file_path, errors)
+    if snapshots_available():
+        try:
+            write_snapshot(df, snapshot_path)
+        except Exception as e:
+            print(f"Error writing snapshot {snapshot_path}: {str(e)}")
+    return df
+
 def get_unique_values(df, column):
     """Get sorted unique values from a column, splitting comma-separated values for Interest Category."""
     if column == 'Interest Category':
+        # Vocabulary built once at load time
+        if 'category_vocabulary' in df.attrs:
+            return list(df.attrs['category_vocabulary'])
+
         # Handle comma-separated categories
         all_categories = set()
         for value in df[column].dropna().unique():
@@ -442,40 +933,76 @@ def get_distance_badge_info(distance):
     else:
         return "far", f"{distance:.1f}mi"
 
+# Availability levels, most to least available, and their badge colors
+AVAILABILITY_LEVELS = ['Spots Open', 'Almost Full', 'Waitlist', 'Full']
+AVAILABILITY_COLORS = {
+    'Spots Open': "#38A169",  # Natural green
+    'Almost Full': "#ffc107",  # Yellow
+    'Waitlist': "#fd7e14",  # Orange
+    'Full': "#dc3545",  # Red
+}
+# Status text columns checked in order, and the keywords for each level
+AVAILABILITY_COLUMNS = ['Enrollment Status', 'Availability', 'Status', 'Spots']
+AVAILABILITY_KEYWORDS = [
+    ('Full', ['full', 'closed', 'no spots', 'capacity']),
+    ('Waitlist', ['waitlist', 'waiting', 'wait list']),
+    ('Spots Open', ['open', 'available', 'spots', 'accepting']),
+]
+
+def add_availability_column(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add an ordered categorical 'availability' column (AVAILABILITY_LEVELS),
+    the vectorized equivalent of get_availability_status: the first status
+    column with a recognized keyword wins, then Max Capacity / Current
+    Enrollment (90% or more is Almost Full), else Spots Open.
+    """
+    status = pd.Series(pd.NA, index=df.index, dtype=object)
+    for col in AVAILABILITY_COLUMNS:
+        if col not in df.columns:
+            continue
+        text = df[col].astype(object).where(df[col].notna()).astype('string').str.lower()
+        undecided = status.isna()
+        for level, words in AVAILABILITY_KEYWORDS:
+            matches = text.str.contains('|'.join(words), regex=True).fillna(False).astype(bool)
+            status[undecided & matches] = level
+            undecided &= ~matches
+
+    if 'Max Capacity' in df.columns and 'Current Enrollment' in df.columns:
+        max_cap = pd.to_numeric(df['Max Capacity'], errors='coerce')
+        current = pd.to_numeric(df['Current Enrollment'], errors='coerce')
+        undecided = status.isna()
+        status[undecided & (current >= max_cap)] = 'Full'
+        status[status.isna() & (current >= max_cap * 0.9)] = 'Almost Full'
+
+    status = status.fillna('Spots Open')
+    df['availability'] = pd.Categorical(status, categories=AVAILABILITY_LEVELS, ordered=True)
+    return df
+
 def get_availability_status(program):
     """Return availability status and color based on program data"""
-    # Check for availability indicators in various columns
-    availability_columns = ['Enrollment Status', 'Availability', 'Status', 'Spots']
-    
-    for col in availability_columns:
+    # Computed once at load time
+    if 'availability' in program and not pd.isna(program['availability']):
+        return program['availability'], AVAILABILITY_COLORS[program['availability']]
+
+    # Same rules as add_availability_column, for rows without the column
+    for col in AVAILABILITY_COLUMNS:
         if col in program and not pd.isna(program[col]):
             status_text = str(program[col]).lower()
-            
-            # Full/Closed indicators
-            if any(word in status_text for word in ['full', 'closed', 'no spots', 'capacity']):
-                return "Full", "#dc3545"  # Red
-            
-            # Waitlist indicators  
-            elif any(word in status_text for word in ['waitlist', 'waiting', 'wait list']):
-                return "Waitlist", "#fd7e14"  # Orange
-            
-            # Open/Available indicators
-            elif any(word in status_text for word in ['open', 'available', 'spots', 'accepting']):
-                return "Spots Open", "#38A169"  # Natural green
-    
+            for level, words in AVAILABILITY_KEYWORDS:
+                if any(word in status_text for word in words):
+                    return level, AVAILABILITY_COLORS[level]
+
     # Check for numerical capacity if available
     if 'Max Capacity' in program and 'Current Enrollment' in program:
         try:
             max_cap = float(program['Max Capacity'])
             current = float(program['Current Enrollment'])
             if current >= max_cap:
-                return "Full", "#dc3545"
+                return "Full", AVAILABILITY_COLORS['Full']
             elif current >= max_cap * 0.9:  # 90% full
-                return "Almost Full", "#ffc107"  # Yellow
-            else:
-                return "Spots Open", "#28a745"
+                return "Almost Full", AVAILABILITY_COLORS['Almost Full']
         except (ValueError, TypeError):
             pass
-    
+
     # Default - assume spots are open if no info available
-    return "Spots Open", "#28a745"
\ No newline at end of file
+    return "Spots Open", AVAILABILITY_COLORS['Spots Open']